@@ -0,0 +1,304 @@
+"""
+Benchmark the drawing of the example curves and the animation modes.
+
+Every case runs in a forked process so that its peak memory is measured on
+its own. The cases are traced, the time of each stage is the sum of its spans
+(grid, term, mask, scatter, rasterize, composite, encode...) and the median of
+the repeated runs of each stage and of the whole case is recorded as JSON.
+Given a baseline produced by an earlier run, the cases that got slower or
+use more memory than the threshold allows are reported and the script exits
+with status 1.
+
+    python benchmarks/run_benchmarks.py --output results/benchmarks.json
+    python benchmarks/run_benchmarks.py --baseline results/benchmarks.json
+"""
+
+from argparse import ArgumentParser
+from collections import defaultdict
+from pathlib import Path
+from statistics import median
+from typing import Callable, Dict, List, Optional
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import torch
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from canvas import Canvas
+from drawer import Drawer
+from graphs_classes import ParametricCurve
+from make_animation import make_animation
+from options_classes import DrawOptions, ImageOptions
+from scenes import PARAMETRIC_SCENES, SCENES, rotation_factories
+from tracing import disable_tracing, enable_tracing, span
+
+ANIMATION_FRAMES = 12
+ANIMATION_MODES = {
+    "sequential": {},
+    "batch": {"batch_size": 4},
+    "workers": {"workers": 2},
+    "encoder_queue": {"encoder_queue_size": 8},
+}
+# Differences below these are noise, whatever the threshold
+MIN_TIME_DIFFERENCE = 0.005  # seconds
+MIN_MEMORY_DIFFERENCE = 16.0  # MB
+
+
+def draw_case(scene: str, size: int, precision: int) -> Dict[str, float]:
+    def run() -> None:
+        with span("curve"):
+            curve = SCENES[scene](precision)
+
+        if isinstance(curve, ParametricCurve):
+            draw_bounds = curve.draw_interval_bounds
+        else:
+            draw_bounds = curve.interval_bounds
+        image_options = ImageOptions(
+            size=(size, size), draw_bounds=draw_bounds, show_axes=True
+        )
+
+        with span("canvas"):
+            image = Canvas(options=image_options)
+
+        with span("draw"):
+            Drawer(curve, DrawOptions(1, (0, 0, 0)), image, scene).draw()
+
+    return traced_stages(run)
+
+
+def animation_case(mode: str, size: int) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as directory:
+        return traced_stages(
+            lambda: make_animation(
+                [0, 360],
+                ANIMATION_FRAMES,
+                rotation_factories(),
+                [
+                    DrawOptions(1, (120, 190, 235)),
+                    DrawOptions(1, (220, 235, 105)),
+                    DrawOptions(1, (235, 130, 120)),
+                ],
+                ImageOptions(
+                    size=(size, size), draw_bounds=[[-8, 8], [-8, 8]], show_axes=False
+                ),
+                os.path.join(directory, "animation.avi"),
+                **ANIMATION_MODES[mode],
+            )
+        )
+
+
+def traced_stages(run: Callable[[], None]) -> Dict[str, float]:
+    """
+    Run with tracing enabled, returning the seconds spent in each stage,
+    summed over its spans, and in the whole run as "total".
+
+    Stages nest, e.g. "draw" includes the "term" and "scatter" spans of the
+    drawer, so they don't add up to the total.
+    """
+    tracer = enable_tracing()
+    try:
+        start = time.perf_counter()
+        run()
+        total = time.perf_counter() - start
+    finally:
+        disable_tracing()
+
+    stages = defaultdict(float)
+    for event in tracer.events:
+        stages[event.name] += event.duration / 1e9
+    stages["total"] = total
+    return dict(stages)
+
+
+def run_isolated(
+    case: Callable[..., Dict[str, float]], args: tuple, threads: int, repeat: int
+) -> Dict:
+    """
+    Run case(*args) once to warm up then repeat times in a forked process,
+    returning the median timings of each stage and the peak memory.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            torch.set_num_threads(threads)
+            rss_before = _current_rss_mb()
+            with contextlib.redirect_stdout(io.StringIO()):
+                case(*args)
+                runs = [case(*args) for _ in range(repeat)]
+            # A stage may not be traced on every run, e.g. a cache miss
+            stages = sorted({stage for run in runs for stage in run})
+            result = {
+                "stages": {
+                    stage: median(run.get(stage, 0.0) for run in runs)
+                    for stage in stages
+                },
+                "rss_before_mb": rss_before,
+            }
+        except BaseException as error:
+            result = {"error": repr(error)}
+        with os.fdopen(write_fd, "w") as file:
+            json.dump(result, file)
+        os._exit(0)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd) as file:
+        result = json.load(file)
+    _, _, usage = os.wait4(pid, 0)
+    # ru_maxrss is in kilobytes on Linux
+    result["peak_rss_mb"] = usage.ru_maxrss / 1024
+    if "rss_before_mb" in result:
+        result["peak_rss_increase_mb"] = result["peak_rss_mb"] - result.pop(
+            "rss_before_mb"
+        )
+    return result
+
+
+def run_benchmarks(
+    sizes: List[int],
+    precisions: List[int],
+    threads: List[int],
+    repeat: int,
+    name_filter: Optional[str] = None,
+) -> Dict:
+    cases = []
+    for scene in SCENES:
+        for size in sizes:
+            for precision in precisions if scene in PARAMETRIC_SCENES else [None]:
+                for thread_count in threads:
+                    name = f"draw/{scene}/{size}px"
+                    if precision is not None:
+                        name += f"/{precision}samples"
+                    cases.append(
+                        (
+                            f"{name}/{thread_count}threads",
+                            draw_case,
+                            (scene, size, precision),
+                            thread_count,
+                        )
+                    )
+    for mode in ANIMATION_MODES:
+        for size in sizes:
+            cases.append(
+                (f"animation/{mode}/{size}px", animation_case, (mode, size), 1)
+            )
+
+    results = {}
+    for name, case, args, thread_count in cases:
+        if name_filter is not None and name_filter not in name:
+            continue
+        results[name] = run_isolated(case, args, thread_count, repeat)
+        print(_describe(name, results[name]))
+
+    return {
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+        },
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(report: Dict, baseline: Dict, threshold: float) -> List[str]:
+    # Cases only present on one side are skipped
+    regressions = []
+    for name, result in report["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None or "error" in result or "error" in reference:
+            continue
+
+        for stage, duration in result["stages"].items():
+            reference_duration = reference["stages"].get(stage)
+            if (
+                reference_duration is not None
+                and duration > reference_duration * (1 + threshold)
+                and duration - reference_duration > MIN_TIME_DIFFERENCE
+            ):
+                regressions.append(
+                    f"{name} {stage}: {reference_duration:.4f}s -> {duration:.4f}s"
+                )
+
+        memory = result.get("peak_rss_increase_mb", 0.0)
+        reference_memory = reference.get("peak_rss_increase_mb", 0.0)
+        if (
+            memory > reference_memory * (1 + threshold)
+            and memory - reference_memory > MIN_MEMORY_DIFFERENCE
+        ):
+            regressions.append(
+                f"{name} memory: {reference_memory:.1f}MB -> {memory:.1f}MB"
+            )
+    return regressions
+
+
+def _describe(name: str, result: Dict) -> str:
+    if "error" in result:
+        return f"{name}: failed with {result['error']}"
+    stages = ", ".join(
+        f"{stage} {duration:.4f}s" for stage, duration in result["stages"].items()
+    )
+    return f"{name}: {stages}, peak +{result['peak_rss_increase_mb']:.1f}MB"
+
+
+def _current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 1024])
+    parser.add_argument(
+        "--precisions", type=int, nargs="+", default=[10_000, 1_000_000]
+    )
+    parser.add_argument(
+        "--threads", type=int, nargs="+", default=sorted({1, os.cpu_count()})
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", help="only run the cases whose name contains it")
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare to")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="relative slowdown or memory increase reported as a regression",
+    )
+    arguments = parser.parse_args()
+
+    report = run_benchmarks(
+        arguments.sizes,
+        arguments.precisions,
+        arguments.threads,
+        arguments.repeat,
+        arguments.filter,
+    )
+
+    if arguments.output is not None:
+        Path(arguments.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(arguments.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if arguments.baseline is not None:
+        with open(arguments.baseline) as file:
+            regressions = compare(report, json.load(file), arguments.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regression")
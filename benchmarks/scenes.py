@@ -0,0 +1,127 @@
+from typing import Callable, Dict, List, Tuple, Union
+import sys
+from pathlib import Path
+
+import torch
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from graphs_classes import (
+    FunctionCurve,
+    ImplicitFunctionGraph,
+    ImplicitFunctionGraphFactory,
+    ParametricCurve,
+    PolarCurve,
+)
+
+Curve = Union[ParametricCurve, ImplicitFunctionGraph]
+
+
+def _rotate(
+    x: torch.Tensor, y: torch.Tensor, angle: Union[float, torch.Tensor]
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    angle_rad = torch.deg2rad(torch.as_tensor(angle, dtype=x.dtype))
+    cos_theta, sin_theta = torch.cos(angle_rad), torch.sin(angle_rad)
+    y_p = y + 1
+    return x * cos_theta - y_p * sin_theta, x * sin_theta + y_p * cos_theta - 1
+
+
+def _f1(x: torch.Tensor, y: torch.Tensor) -> torch.Tensor:
+    return (
+        torch.arctan(2 * torch.cos(x) ** 2 + 2 * torch.sin(y) ** 2)
+        + torch.sin(y)
+        - torch.sin(x)
+        - 2 * torch.cos(x**2 + y**2)
+    )
+
+
+def _f2(x: torch.Tensor, y: torch.Tensor) -> torch.Tensor:
+    return (
+        torch.arctan(2 * torch.cos(x) ** 2 + 2 * torch.sin(y) ** 2)
+        - torch.sin(y)
+        + torch.sin(x)
+        - 2 * torch.cos(x**2 + y**2)
+    )
+
+
+def _f3(x: torch.Tensor, y: torch.Tensor) -> torch.Tensor:
+    return torch.maximum(_f1(x, y), _f2(x, y))
+
+
+# The curves of the examples, fixed at one parameter value
+def _function_curve(precision: int) -> Curve:
+    return FunctionCurve(
+        [-8, 8], [[-8, 8], [-8, 8]], lambda x: torch.sin(x), precision
+    ).to_parametric()
+
+
+def _polar_curve(precision: int) -> Curve:
+    return PolarCurve(
+        [0, 50 * torch.pi],
+        [[-4, 4], [-4, 4]],
+        lambda r: 3 * torch.sin((24 * r) / 25),
+        precision,
+    ).to_parametric()
+
+
+def _parametric_curve(precision: int) -> Curve:
+    return ParametricCurve(
+        [0, 6 * torch.pi],
+        [[-15, 15], [-15, 15]],
+        x_func=lambda x: 8 * torch.cos(x) - 6 * torch.cos((8 * x) / 3),
+        y_func=lambda y: 8 * torch.sin(y) - 6 * torch.sin((8 * y) / 3),
+        precision=precision,
+    )
+
+
+def _implicit_equal(precision: int) -> Curve:
+    return ImplicitFunctionGraph(
+        lambda x, y: _f1(*_rotate(x, y, 30)), "=", 0.05, [[-8, 8], [-8, 8]]
+    )
+
+
+def _implicit_less(precision: int) -> Curve:
+    return ImplicitFunctionGraph(
+        lambda x, y: _f3(*_rotate(x, y, 30)), "<", 10e-5, [[-8, 8], [-8, 8]]
+    )
+
+
+def _implicit_greater(precision: int) -> Curve:
+    return ImplicitFunctionGraph(
+        lambda x, y: torch.floor(torch.cos(torch.floor(x**2)))
+        + torch.floor(torch.cos(torch.floor(y**2)))
+        + torch.tan(x**2 + y**2)
+        - torch.cos(1.75 * x * y)
+        - 0.3,
+        ">",
+        1e-10,
+        [[-4, 4], [-4, 4]],
+    )
+
+
+# name -> builder of the curve for a precision, implicit graphs ignore it and
+# are sampled once per pixel
+SCENES: Dict[str, Callable[[int], Curve]] = {
+    "function": _function_curve,
+    "polar": _polar_curve,
+    "parametric": _parametric_curve,
+    "implicit=": _implicit_equal,
+    "implicit<": _implicit_less,
+    "implicit>": _implicit_greater,
+}
+PARAMETRIC_SCENES = ["function", "polar", "parametric"]
+
+
+def rotation_factories() -> List[ImplicitFunctionGraphFactory]:
+    # The three layers of the rotation example
+    return [
+        ImplicitFunctionGraphFactory(
+            lambda p, f=f: ImplicitFunctionGraph(
+                lambda t_x, t_y: f(*_rotate(t_x, t_y, p)),
+                "<",
+                10e-5,
+                [[-8, 8], [-8, 8]],
+            )
+        )
+        for f in [_f1, _f2, _f3]
+    ]
@@ -1,105 +1,183 @@
-from typing import Tuple
+from functools import lru_cache
+from typing import NamedTuple, Tuple
+import numpy as np
 import torch
 
+from image_writers import strip_writer
 from options_classes import ImageOptions
 
+SAVE_STRIP_ROWS = 256  # rows read from the backing file per encoded strip
+
+
+class BackgroundKey(NamedTuple):
+    # the ImageOptions fields the background layer depends on
+    size: Tuple[int, int]
+    draw_bounds: Tuple[Tuple[float, float], Tuple[float, float]]
+    background_color: Tuple[int]
+    show_axes: bool
+    axis_color: Tuple[int]
+    grid_color: Tuple[int]
+    tick_length: int
+
+    @classmethod
+    def from_options(cls, options: ImageOptions) -> "BackgroundKey":
+        return cls(
+            size=tuple(options.size),
+            draw_bounds=tuple(tuple(bounds) for bounds in options.draw_bounds),
+            background_color=tuple(options.background_color),
+            show_axes=options.show_axes,
+            axis_color=tuple(options.axis_color),
+            grid_color=tuple(options.grid_color),
+            tick_length=options.tick_length,
+        )
+
 
 class Canvas:
     def __init__(self, options: ImageOptions) -> None:
         self.options = options
-        self.image = torch.zeros(
-            (
-                self.options.size[1],
-                self.options.size[0],
-                3,
-            ),
-            dtype=torch.uint8,
-        )
+        # The background, grid, axes and ticks are rendered once per distinct
+        # options, each canvas starts from a copy of that layer
+        self.image = background_layer(BackgroundKey.from_options(options)).clone()
+        self.name = self.options.name
+
+    def save(self, path: str) -> None:
+        from PIL import Image
+
+        pil_image = Image.fromarray(self.image.numpy())
+        pil_image.save(path)
+
+
+class MemmapCanvas(Canvas):
+    """
+    Canvas whose pixels live in options.backing_file instead of in memory.
 
-        background_color = torch.tensor(
-            self.options.background_color, dtype=torch.uint8
+    The drawers write into the memory-mapped file like into any canvas, the
+    operating system pages it in and out as needed. `save` encodes PNG and
+    TIFF files strip by strip so the image never has to fit in memory.
+    """
+
+    def __init__(self, options: ImageOptions) -> None:
+        self.options = options
+        self.pixels = np.memmap(
+            options.backing_file,
+            dtype=np.uint8,
+            mode="w+",
+            shape=(options.size[1], options.size[0], 3),
         )
-        self.image[:, :, 0] = background_color[0]
-        self.image[:, :, 1] = background_color[1]
-        self.image[:, :, 2] = background_color[2]
+        self.image = torch.from_numpy(self.pixels)
+        _draw_background(self.image, BackgroundKey.from_options(options))
         self.name = self.options.name
 
-        if self.options.show_axes:
-            self._draw_frame()
-
-    def _draw_frame(self) -> None:
-        self._draw_grid()
-        self._draw_axes()
-        self._draw_ticks()
-
-    def _draw_grid(self) -> None:
-        x_min, x_max = self.options.draw_bounds[0]
-        y_min, y_max = self.options.draw_bounds[1]
-        scale_x, scale_y = self._calculate_scale()
-        offset_x, offset_y = self._calculate_offset(scale_x, scale_y)
-
-        for i in range(int(x_min), int(x_max) + 1):
-            x = int(i * scale_x + offset_x)
-            self.image[:, x, :] = torch.tensor(
-                self.options.grid_color, dtype=torch.uint8
-            )
-
-        for i in range(int(y_min), int(y_max) + 1):
-            y = int(i * scale_y + offset_y)
-            self.image[y, :, :] = torch.tensor(
-                self.options.grid_color, dtype=torch.uint8
-            )
-
-    def _draw_axes(self) -> None:
-        scale_x, scale_y = self._calculate_scale()
-        offset_x, offset_y = self._calculate_offset(scale_x, scale_y)
-
-        offset_x = int(offset_x)
-        offset_y = int(offset_y)
-
-        # Horizontal axis
-        self.image[offset_y, :, :] = torch.tensor(
-            self.options.axis_color, dtype=torch.uint8
-        )
-        # Vertical axis
-        self.image[:, offset_x, :] = torch.tensor(
-            self.options.axis_color, dtype=torch.uint8
-        )
+    def save(self, path: str) -> None:
+        writer = strip_writer(path, tuple(self.options.size))
+        for row in range(0, self.options.size[1], SAVE_STRIP_ROWS):
+            writer.write_rows(np.asarray(self.pixels[row : row + SAVE_STRIP_ROWS]))
+        writer.close()
 
-    def _draw_ticks(self) -> None:
-        x_min, x_max = self.options.draw_bounds[0]
-        y_min, y_max = self.options.draw_bounds[1]
-        scale_x, scale_y = self._calculate_scale()
-        offset_x, offset_y = self._calculate_offset(scale_x, scale_y)
-        tick_length = self.options.tick_length
-
-        for i in range(int(x_min), int(x_max) + 1):
-            x = int(i * scale_x + offset_x)
-            self.image[
-                int(offset_y - tick_length) : int(offset_y + tick_length), x, :
-            ] = torch.tensor(self.options.axis_color, dtype=torch.uint8)
-
-        for i in range(int(y_min), int(y_max) + 1):
-            y = int(i * scale_y + offset_y)
-            self.image[
-                y, int(offset_x - tick_length) : int(offset_x + tick_length), :
-            ] = torch.tensor(self.options.axis_color, dtype=torch.uint8)
-
-    def _calculate_scale(self) -> Tuple[float, float]:
-        x_min, x_max = self.options.draw_bounds[0]
-        y_min, y_max = self.options.draw_bounds[1]
-        return (
-            self.options.size[0] / (x_max - x_min),
-            self.options.size[1] / (y_max - y_min),
-        )
+    def flush(self) -> None:
+        self.pixels.flush()
 
-    def _calculate_offset(self, scale_x: float, scale_y: float) -> Tuple[float, float]:
-        x_min, _ = self.options.draw_bounds[0]
-        y_min, _ = self.options.draw_bounds[1]
-        return (-x_min * scale_x, -y_min * scale_y)
 
-    def save(self, path: str) -> None:
-        from PIL import Image
+@lru_cache(maxsize=4)
+def background_layer(key: BackgroundKey) -> torch.Tensor:
+    # The returned tensor is shared, it must be copied before being drawn on
+    image = torch.empty((key.size[1], key.size[0], 3), dtype=torch.uint8)
+    _draw_background(image, key)
+    return image
+
+
+def _draw_background(image: torch.Tensor, key: BackgroundKey) -> None:
+    image[:, :] = torch.tensor(key.background_color, dtype=torch.uint8)
+
+    if key.show_axes:
+        _draw_frame(image, key)
+
+
+def _draw_frame(image: torch.Tensor, key: BackgroundKey) -> None:
+    _draw_grid(image, key)
+    _draw_axes(image, key)
+    _draw_ticks(image, key)
+
+
+def _draw_grid(image: torch.Tensor, key: BackgroundKey) -> None:
+    grid_color = torch.tensor(key.grid_color, dtype=torch.uint8)
+    columns, rows = _grid_lines(key)
+
+    image[:, columns, :] = grid_color
+    image[rows, :, :] = grid_color
+
+
+def _draw_axes(image: torch.Tensor, key: BackgroundKey) -> None:
+    axis_color = torch.tensor(key.axis_color, dtype=torch.uint8)
+    offset_x, offset_y = _calculate_offset(key, *_calculate_scale(key))
+
+    offset_x = int(offset_x)
+    offset_y = int(offset_y)
+
+    # Horizontal axis
+    if -key.size[1] <= offset_y < key.size[1]:
+        image[offset_y, :, :] = axis_color
+    # Vertical axis
+    if -key.size[0] <= offset_x < key.size[0]:
+        image[:, offset_x, :] = axis_color
+
+
+def _draw_ticks(image: torch.Tensor, key: BackgroundKey) -> None:
+    axis_color = torch.tensor(key.axis_color, dtype=torch.uint8)
+    offset_x, offset_y = _calculate_offset(key, *_calculate_scale(key))
+    columns, rows = _grid_lines(key)
+    tick_length = key.tick_length
+
+    # Ticks keep the slice semantics of the axis they are centered on, a
+    # slice that ends up reversed selects nothing
+    tick_rows = torch.arange(key.size[1])[
+        int(offset_y - tick_length) : int(offset_y + tick_length)
+    ]
+    tick_columns = torch.arange(key.size[0])[
+        int(offset_x - tick_length) : int(offset_x + tick_length)
+    ]
+
+    image[tick_rows[:, None], columns[None, :], :] = axis_color
+    image[rows[:, None], tick_columns[None, :], :] = axis_color
+
+
+def _grid_lines(key: BackgroundKey) -> Tuple[torch.Tensor, torch.Tensor]:
+    # Columns and rows of the lines at integer coordinates, computed in double
+    # precision like the Python floats they replace
+    x_min, x_max = key.draw_bounds[0]
+    y_min, y_max = key.draw_bounds[1]
+    scale_x, scale_y = _calculate_scale(key)
+    offset_x, offset_y = _calculate_offset(key, scale_x, scale_y)
+
+    columns = (
+        torch.arange(int(x_min), int(x_max) + 1, dtype=torch.float64) * scale_x
+        + offset_x
+    ).long()
+    rows = (
+        torch.arange(int(y_min), int(y_max) + 1, dtype=torch.float64) * scale_y
+        + offset_y
+    ).long()
+
+    # Negative indices wrap around like the Python indexing of the former
+    # loops, lines past either end of the image are skipped
+    return (
+        columns[(columns >= -key.size[0]) & (columns < key.size[0])] % key.size[0],
+        rows[(rows >= -key.size[1]) & (rows < key.size[1])] % key.size[1],
+    )
+
+
+def _calculate_scale(key: BackgroundKey) -> Tuple[float, float]:
+    x_min, x_max = key.draw_bounds[0]
+    y_min, y_max = key.draw_bounds[1]
+    return (
+        key.size[0] / (x_max - x_min),
+        key.size[1] / (y_max - y_min),
+    )
 
-        pil_image = Image.fromarray(self.image.numpy())
-        pil_image.save(path)
+
+def _calculate_offset(
+    key: BackgroundKey, scale_x: float, scale_y: float
+) -> Tuple[float, float]:
+    x_min, _ = key.draw_bounds[0]
+    y_min, _ = key.draw_bounds[1]
+    return (-x_min * scale_x, -y_min * scale_y)
@@ -1,5 +1,16 @@
 from colorsys import rgb_to_hls, hls_to_rgb, rgb_to_hsv, hsv_to_rgb
 from typing import Tuple, Protocol, runtime_checkable
+import torch
+
+# The constants of colorsys, the tensor conversions follow its formulas
+# operation by operation
+ONE_THIRD = 1.0 / 3.0
+ONE_SIXTH = 1.0 / 6.0
+TWO_THIRD = 2.0 / 3.0
+# (r, g, b) as indices into (v, t, p, q) for each sector of the hue circle
+HSV_SECTORS = torch.tensor(
+    [[0, 1, 2], [3, 0, 2], [2, 0, 1], [2, 3, 0], [1, 2, 0], [0, 2, 3]]
+)
 
 
 @runtime_checkable
@@ -14,6 +25,14 @@ class ColorSpace(Protocol):
         self, color: Tuple[float, float, float]
     ) -> Tuple[float, float, float]: ...
 
+    def convert_to_tensor(self, colors: torch.Tensor) -> torch.Tensor:
+        """Convert (..., 3) RGB colors, same as convert_to on every color"""
+        ...
+
+    def convert_from_tensor(self, colors: torch.Tensor) -> torch.Tensor:
+        """Convert (..., 3) colors back to RGB, same as convert_from"""
+        ...
+
     @property
     def hue_positions(self) -> Tuple[bool, bool, bool]:
         """Returns a tuple indicating which components are hue values"""
@@ -31,6 +50,12 @@ class RGBSpace:
     ) -> Tuple[float, float, float]:
         return color
 
+    def convert_to_tensor(self, colors: torch.Tensor) -> torch.Tensor:
+        return colors
+
+    def convert_from_tensor(self, colors: torch.Tensor) -> torch.Tensor:
+        return colors
+
     @property
     def hue_positions(self) -> Tuple[bool, bool, bool]:
         return (False, False, False)
@@ -47,6 +72,12 @@ class HSLSpace:
     ) -> Tuple[float, float, float]:
         return hls_to_rgb(*color)
 
+    def convert_to_tensor(self, colors: torch.Tensor) -> torch.Tensor:
+        return _rgb_to_hls(colors)
+
+    def convert_from_tensor(self, colors: torch.Tensor) -> torch.Tensor:
+        return _hls_to_rgb(colors)
+
     @property
     def hue_positions(self) -> Tuple[bool, bool, bool]:
         return (True, False, False)
@@ -63,6 +94,83 @@ class HSVSpace:
     ) -> Tuple[float, float, float]:
         return hsv_to_rgb(*color)
 
+    def convert_to_tensor(self, colors: torch.Tensor) -> torch.Tensor:
+        return _rgb_to_hsv(colors)
+
+    def convert_from_tensor(self, colors: torch.Tensor) -> torch.Tensor:
+        return _hsv_to_rgb(colors)
+
     @property
     def hue_positions(self) -> Tuple[bool, bool, bool]:
         return (True, False, False)
+
+
+def _hue(
+    colors: torch.Tensor, maxc: torch.Tensor, rangec: torch.Tensor
+) -> torch.Tensor:
+    r, g, b = colors.unbind(-1)
+    rc = (maxc - r) / rangec
+    gc = (maxc - g) / rangec
+    bc = (maxc - b) / rangec
+    h = torch.where(
+        r == maxc, bc - gc, torch.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc)
+    )
+    return torch.remainder(h / 6.0, 1.0)
+
+
+def _rgb_to_hls(colors: torch.Tensor) -> torch.Tensor:
+    maxc = colors.amax(dim=-1)
+    minc = colors.amin(dim=-1)
+    sumc = maxc + minc
+    rangec = maxc - minc
+    l = sumc / 2.0
+    s = torch.where(l <= 0.5, rangec / sumc, rangec / (2.0 - maxc - minc))
+    # Greys have no hue, their nan divisions are discarded
+    grey = minc == maxc
+    h = torch.where(grey, 0.0, _hue(colors, maxc, rangec))
+    return torch.stack([h, l, torch.where(grey, 0.0, s)], dim=-1)
+
+
+def _hls_to_rgb(colors: torch.Tensor) -> torch.Tensor:
+    h, l, s = colors.unbind(-1)
+    m2 = torch.where(l <= 0.5, l * (1.0 + s), l + s - (l * s))
+    m1 = 2.0 * l - m2
+    rgb = torch.stack(
+        [_v(m1, m2, h + ONE_THIRD), _v(m1, m2, h), _v(m1, m2, h - ONE_THIRD)], dim=-1
+    )
+    return torch.where((s == 0.0)[..., None], l[..., None], rgb)
+
+
+def _v(m1: torch.Tensor, m2: torch.Tensor, hue: torch.Tensor) -> torch.Tensor:
+    hue = torch.remainder(hue, 1.0)
+    return torch.where(
+        hue < ONE_SIXTH,
+        m1 + (m2 - m1) * hue * 6.0,
+        torch.where(
+            hue < 0.5,
+            m2,
+            torch.where(hue < TWO_THIRD, m1 + (m2 - m1) * (TWO_THIRD - hue) * 6.0, m1),
+        ),
+    )
+
+
+def _rgb_to_hsv(colors: torch.Tensor) -> torch.Tensor:
+    maxc = colors.amax(dim=-1)
+    minc = colors.amin(dim=-1)
+    rangec = maxc - minc
+    grey = minc == maxc
+    h = torch.where(grey, 0.0, _hue(colors, maxc, rangec))
+    s = torch.where(grey, 0.0, rangec / maxc)
+    return torch.stack([h, s, maxc], dim=-1)
+
+
+def _hsv_to_rgb(colors: torch.Tensor) -> torch.Tensor:
+    h, s, v = colors.unbind(-1)
+    i = (h * 6.0).trunc()
+    f = (h * 6.0) - i
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    sectors = HSV_SECTORS.to(colors.device)[torch.remainder(i, 6).long()]
+    rgb = torch.stack([v, t, p, q], dim=-1).gather(-1, sectors)
+    return torch.where((s == 0.0)[..., None], v[..., None], rgb)
@@ -1,4 +1,5 @@
 from typing import Tuple
+import torch
 
 
 class ColorUtils:
@@ -23,6 +24,18 @@ class ColorUtils:
                 h1 += 1.0
         return (h1 + fraction * (h2 - h1)) % 1.0
 
+    @staticmethod
+    def interpolate_hues(
+        h1: torch.Tensor, h2: torch.Tensor, fraction: torch.Tensor
+    ) -> torch.Tensor:
+        """Tensor version of interpolate_hue"""
+        wrap = (h2 - h1).abs() > 0.5
+        h1, h2 = (
+            torch.where(wrap & (h1 <= h2), h1 + 1.0, h1),
+            torch.where(wrap & (h1 > h2), h2 + 1.0, h2),
+        )
+        return torch.remainder(h1 + fraction * (h2 - h1), 1.0)
+
     @staticmethod
     def apply_gamma(color: Tuple[float, ...], gamma: float) -> Tuple[float, ...]:
         """Apply gamma correction to a color tuple"""
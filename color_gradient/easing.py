@@ -1,7 +1,9 @@
 import math
 from typing import Callable
+import torch
 
 EasingFunction = Callable[[float], float]
+TensorEasingFunction = Callable[[torch.Tensor], torch.Tensor]
 
 
 class Easing:
@@ -22,3 +24,34 @@ class Easing:
         if x < 0.5:
             return 4 * x * x * x
         return 1 - pow(-2 * x + 2, 3) / 2
+
+    @staticmethod
+    def vectorize(easing: EasingFunction) -> TensorEasingFunction:
+        """
+        Tensor version of an easing function, custom ones are applied
+        element by element. torch.cos and torch.pow round differently than
+        math.cos and pow, the sine and in-out cubic easings may differ from
+        the scalar ones in their last bits.
+        """
+        vectorized = _TENSOR_EASINGS.get(easing)
+        if vectorized is not None:
+            return vectorized
+        return lambda x: torch.tensor(
+            [easing(value) for value in x.tolist()], dtype=x.dtype, device=x.device
+        )
+
+
+def _ease_in_out_sine(x: torch.Tensor) -> torch.Tensor:
+    return -(torch.cos(math.pi * x) - 1) / 2
+
+
+def _ease_in_out_cubic(x: torch.Tensor) -> torch.Tensor:
+    return torch.where(x < 0.5, 4 * x * x * x, 1 - torch.pow(-2 * x + 2, 3) / 2)
+
+
+_TENSOR_EASINGS = {
+    Easing.linear: Easing.linear,
+    Easing.ease_in_cubic: Easing.ease_in_cubic,
+    Easing.ease_in_out_sine: _ease_in_out_sine,
+    Easing.ease_in_out_cubic: _ease_in_out_cubic,
+}
@@ -1,4 +1,7 @@
+from functools import lru_cache
 from typing import List, Tuple, Dict, Type
+import torch
+
 from .color_spaces import ColorSpace, RGBSpace, HSLSpace, HSVSpace
 from .easing import Easing, EasingFunction
 from .color_utils import ColorUtils
@@ -33,14 +36,7 @@ class GradientGenerator:
         Returns:
             List of RGB tuples representing the gradient
         """
-        if len(colors) < 2:
-            raise ValueError("Color list must contain at least two colors")
-        if steps < 2:
-            raise ValueError("Steps must be at least 2")
-
-        color_space = self.color_spaces.get(colorspace)
-        if not color_space:
-            raise ValueError(f"Unsupported color space: {colorspace}")
+        color_space = self._get_color_space(colors, steps, colorspace)
 
         # Convert colors to 0-1 range and chosen color space
         normalized_colors = [ColorUtils.normalize_rgb(c) for c in colors]
@@ -80,6 +76,46 @@ class GradientGenerator:
 
         return gradient
 
+    def create_gradient_lut(
+        self,
+        colors: List[Tuple[int, int, int]],
+        steps: int,
+        colorspace: str = "HSL",
+        easing: EasingFunction = Easing.linear,
+        gamma: float = 1.0,
+    ) -> torch.Tensor:
+        """
+        Same gradient as create_gradient, computed with tensor operations as
+        a (steps, 3) uint8 lookup table. With a gamma other than 1.0 or the
+        ease_in_out_sine and ease_in_out_cubic easings, a few components may be
+        one level apart as torch.cos and torch.pow round differently than
+        math.cos and pow.
+
+        Tables are cached by their arguments, the returned tensor is shared
+        and must not be modified.
+        """
+        color_space = self._get_color_space(colors, steps, colorspace)
+        return _gradient_lut(
+            tuple(tuple(color) for color in colors),
+            steps,
+            type(color_space),
+            easing,
+            gamma,
+        )
+
+    def _get_color_space(
+        self, colors: List[Tuple[int, int, int]], steps: int, colorspace: str
+    ) -> ColorSpace:
+        if len(colors) < 2:
+            raise ValueError("Color list must contain at least two colors")
+        if steps < 2:
+            raise ValueError("Steps must be at least 2")
+
+        color_space = self.color_spaces.get(colorspace)
+        if not color_space:
+            raise ValueError(f"Unsupported color space: {colorspace}")
+        return color_space
+
     def _interpolate_colors(
         self,
         color1: Tuple[float, ...],
@@ -95,3 +131,44 @@ class GradientGenerator:
             else:
                 result.append(c1 + fraction * (c2 - c1))
         return tuple(result)
+
+
+@lru_cache(maxsize=32)
+def _gradient_lut(
+    colors: Tuple[Tuple[int, int, int], ...],
+    steps: int,
+    color_space_type: Type[ColorSpace],
+    easing: EasingFunction,
+    gamma: float,
+) -> torch.Tensor:
+    # Color spaces are stateless, keying them by type shares the tables
+    # between generators. Computed in double precision like create_gradient.
+    color_space = color_space_type()
+    converted_colors = color_space.convert_to_tensor(
+        torch.tensor(colors, dtype=torch.float64) / 255
+    )
+    if gamma != 1.0:
+        converted_colors = converted_colors.pow(gamma)
+
+    progress = Easing.vectorize(easing)(
+        torch.arange(steps, dtype=torch.float64) / (steps - 1)
+    )
+    idx = progress * (len(colors) - 1)
+    idx1 = idx.trunc().long().clamp(0, len(colors) - 1)
+    idx2 = (idx1 + 1).clamp(max=len(colors) - 1)
+    fraction = (idx - idx1)[:, None]
+
+    c1 = converted_colors[idx1]
+    c2 = converted_colors[idx2]
+    interpolated = c1 + fraction * (c2 - c1)
+    for i, is_hue in enumerate(color_space.hue_positions):
+        if is_hue:
+            interpolated[:, i] = ColorUtils.interpolate_hues(
+                c1[:, i], c2[:, i], fraction[:, 0]
+            )
+
+    if gamma != 1.0:
+        interpolated = interpolated.pow(1 / gamma)
+
+    rgb_colors = color_space.convert_from_tensor(interpolated)
+    return (rgb_colors * 255).trunc().clamp(0, 255).to(torch.uint8)
@@ -1,9 +1,59 @@
-from typing import Tuple, Union
+from bisect import bisect_right
+from typing import Hashable, List, Optional, Tuple, Union
 import torch
 
-from graphs_classes import ParametricCurve, ImplicitFunctionGraph
+from graphs_classes import (
+    Expression,
+    ImplicitFunctionGraph,
+    ParametricCurve,
+    evaluate_expressions,
+)
 from options_classes import DrawOptions
 from canvas import Canvas
+from grid_cache import coordinate_grids
+from marching_squares import contour_level_segments, contour_segments
+from morphology import disc_dilate, disc_offsets
+from parametric_sampling import (
+    adaptive_curve_samples,
+    max_subdivisions,
+    segment_lengths,
+    visible_segments,
+)
+from quadtree import adaptive_mask
+from rasterizer import rasterize_labeled_segments, rasterize_segments
+from tracing import span
+
+ANTIALIASING_TILE_SIZE = 256  # pixels per side of a supersampled tile
+# Rough peak memory of one sample under a memory budget: the float
+# intermediates of a term, its mask and the gathered pixel indices
+BYTES_PER_SAMPLE = 64
+# Parametric chunks are whole multiples of this many samples so that every
+# sample is evaluated by the same vectorized code as in a single pass
+SAMPLE_CHUNK_ALIGNMENT = 1024
+
+
+def _blend(
+    pixels: torch.Tensor, color: Tuple[int], coverage: torch.Tensor
+) -> torch.Tensor:
+    coverage = coverage.unsqueeze(-1)
+    color = torch.tensor(color, dtype=torch.float32)
+    return (pixels * (1 - coverage) + color * coverage).round().to(torch.uint8)
+
+
+def _palette(colors: Union[List[Tuple[int]], torch.Tensor]) -> torch.Tensor:
+    # Colors of the layers 1, 2, ..., layer 0 leaves the pixels untouched
+    return torch.cat(
+        [
+            torch.zeros((1, 3), dtype=torch.uint8),
+            torch.as_tensor(colors, dtype=torch.uint8).view(-1, 3),
+        ]
+    )
+
+
+def _pixel_precision(values: torch.Tensor) -> torch.Tensor:
+    # Pixel coordinates are mapped in at least single precision, half precision
+    # can't even address every column of a 4096 pixels wide image
+    return values.to(torch.promote_types(values.dtype, torch.float32))
 
 
 class Drawer:
@@ -19,6 +69,7 @@ class Drawer:
         self.image = image
         self.name = name
         self.image_bounds = self._get_bounds(image.options.draw_bounds)
+        self.dtype = draw_options.dtype or image.options.dtype
         self.curve_bounds = self._get_curve_bounds()
 
     def draw(
@@ -26,6 +77,10 @@ class Drawer:
         device: torch.device = torch.device("cpu"),
     ) -> None:
         if isinstance(self.curve, ParametricCurve):
+            if self.draw_options.method not in ["sample", "adaptive"]:
+                raise ValueError(
+                    f"The {self.draw_options.method} method only supports implicit function graphs"
+                )
             self._draw_parametric_curve()
         elif isinstance(self.curve, ImplicitFunctionGraph):
             if self._definition_interval_in_draw_interval():
@@ -37,6 +92,20 @@ class Drawer:
         else:
             raise ValueError("Unsupported curve type")
 
+    def fusion_key(self) -> Optional[Hashable]:
+        # Consecutive drawers sharing a key can be drawn together by draw_fused
+        if (
+            not isinstance(self.curve, ImplicitFunctionGraph)
+            or self.draw_options.method != "sample"
+            or self.draw_options.supersampling > 1
+            or self.draw_options.line_width > 1
+            or self.draw_options.levels is not None
+        ):
+            return None
+        # The fused terms are evaluated on the grids of the first drawer, the
+        # device is the same for the whole group
+        return (id(self.image), self.curve_bounds, self.dtype)
+
     def _get_bounds(self, bounds: list[list[float]]) -> Tuple[float]:
         return (bounds[0][0], bounds[0][1], bounds[1][0], bounds[1][1])
 
@@ -51,59 +120,1027 @@ class Drawer:
     def _draw_parametric_curve(
         self, device: torch.device = torch.device("cpu")
     ) -> None:
-        t_min, t_max = self.curve.interval_bounds
         x_func, y_func = self.curve.x_func, self.curve.y_func
 
         scale = self._calculate_scale()
         offset = self._calculate_offset(scale)
-        print(f"parameter between {t_min} and {t_max}")
 
-        # Create a tensor of equally spaced points
-        t = torch.linspace(t_min, t_max, self.curve.precision, device=device)
+        if self.draw_options.method == "adaptive":
+            self._draw_adaptive_parametric_curve(scale, offset, device)
+            return
+
+        # Under a memory budget the samples are generated, evaluated and
+        # plotted chunk by chunk, the functions must be elementwise in t
+        sub_pixels = None
+        for start, end in self._sample_chunks(self.curve.precision):
+            # Create a tensor of equally spaced points
+            with span("samples"):
+                t = self._parameter_samples(start, end, device)
 
-        # Calculate x and y coordinates using the parametric functions
-        x = x_func(t)
-        y = y_func(t)
+            # Calculate x and y coordinates using the parametric functions
+            with span("term"):
+                if (
+                    isinstance(x_func, Expression)
+                    and isinstance(y_func, Expression)
+                    and x_func.variables == y_func.variables
+                ):
+                    x, y = evaluate_expressions([x_func, y_func], t)
+                else:
+                    x = x_func(t)
+                    y = y_func(t)
 
-        # Calculate pixel coordinates
-        pixel_x = ((x * scale[0]) + offset[0]).long()
-        pixel_y = ((y * scale[1]) + offset[1]).long()
+            # Calculate pixel coordinates
+            with span("pixel_mapping"):
+                pixel_x = (_pixel_precision(x) * scale[0]) + offset[0]
+                pixel_y = (_pixel_precision(y) * scale[1]) + offset[1]
 
-        # Clamp pixel coordinates to image bounds
-        pixel_x = pixel_x.clamp(0, self.image.options.size[0] - 1)
-        pixel_y = pixel_y.clamp(0, self.image.options.size[1] - 1)
+            if self.draw_options.supersampling > 1:
+                # The covered sub-pixels are merged as the chunks come, they
+                # never outnumber the sub-pixels of the image
+                with span("coverage"):
+                    chunk_sub_pixels = self._antialiased_sub_pixels(pixel_x, pixel_y)
+                    sub_pixels = (
+                        chunk_sub_pixels
+                        if sub_pixels is None
+                        else torch.unique(torch.cat((sub_pixels, chunk_sub_pixels)))
+                    )
+                continue
 
-        # Draw points on the image
-        self.image.image[pixel_y, pixel_x] = torch.tensor(
-            self.draw_options.draw_color, dtype=torch.uint8
+            with span("pixel_mapping"):
+                pixel_x = pixel_x.long()
+                pixel_y = pixel_y.long()
+
+            # Draw points on the image
+            self._plot_pixels(
+                self.image, self.draw_options.draw_color, pixel_x, pixel_y
+            )
+
+        if sub_pixels is not None:
+            with span("blend"):
+                self._plot_antialiased_sub_pixels(sub_pixels)
+
+    def _parameter_samples(
+        self, start: int, end: int, device: torch.device
+    ) -> torch.Tensor:
+        # Samples start to end of the precision equally spaced parameter values,
+        # only the chunk being drawn is allocated. The values only depend on
+        # their index, so a budget never changes the pixels drawn.
+        t_min, t_max = self.curve.interval_bounds
+        count = self.curve.precision
+        index = torch.arange(start, end, dtype=torch.float64)
+        step = (t_max - t_min) / max(count - 1, 1)
+
+        # Like torch.linspace, each half is measured from its closest bound
+        return torch.where(
+            index < max(count // 2, 1),
+            t_min + step * index,
+            t_max - step * (count - 1 - index),
+        ).to(device=device, dtype=self.dtype)
+
+    def _draw_adaptive_parametric_curve(
+        self, scale: Tuple[float], offset: Tuple[float], device: torch.device
+    ) -> None:
+        size = self.image.options.size
+        step = self.draw_options.grid_step
+
+        # Refinement only looks at the ends of each interval, under a memory
+        # budget the intervals are refined and rasterized chunk by chunk, each
+        # chunk sharing its last sample with the next one. A refinement pass
+        # may split every interval of a chunk in up to max_subdivisions parts,
+        # the chunks are sized for it.
+        for start, end in self._sample_chunks(
+            self.curve.precision - 1, max_subdivisions(size, step)
+        ):
+            with span("samples"):
+                t = self._parameter_samples(start, end + 1, device)
+
+            with span("adaptive_sampling"):
+                pixel_x, pixel_y = adaptive_curve_samples(
+                    self.curve.x_func,
+                    self.curve.y_func,
+                    t,
+                    lambda x, y: (
+                        (_pixel_precision(x) * scale[0]) + offset[0],
+                        (_pixel_precision(y) * scale[1]) + offset[1],
+                    ),
+                    size,
+                    step,
+                )
+
+            # Consecutive samples are joined, except across the jumps of a
+            # discontinuous curve which refinement couldn't bring under the step
+            with span("rasterize"):
+                keep = visible_segments(pixel_x, pixel_y, size) & (
+                    segment_lengths(pixel_x, pixel_y) <= 2 * step
+                )
+                pixel_x, pixel_y = rasterize_segments(
+                    pixel_x[:-1][keep],
+                    pixel_y[:-1][keep],
+                    pixel_x[1:][keep],
+                    pixel_y[1:][keep],
+                )
+
+            # Off-screen pixels are dropped rather than clamped on the border,
+            # and each pixel is written once
+            inside = (
+                (pixel_x >= 0)
+                & (pixel_x < size[0])
+                & (pixel_y >= 0)
+                & (pixel_y < size[1])
+            )
+            pixels = torch.unique(pixel_y[inside] * size[0] + pixel_x[inside])
+            self._plot_pixels(
+                self.image,
+                self.draw_options.draw_color,
+                pixels % size[0],
+                pixels // size[0],
+            )
+
+    def _antialiased_sub_pixels(
+        self, pixel_x: torch.Tensor, pixel_y: torch.Tensor
+    ) -> torch.Tensor:
+        supersampling = self.draw_options.supersampling
+        width, height = self.image.options.size
+
+        # The curve is drawn with a round pen line_width pixels wide: every
+        # sample covers a disc of sub-pixels, each covered sub-pixel counting once
+        pen_x, pen_y = disc_offsets(self.draw_options.line_width * supersampling)
+        sub_x = (pixel_x * supersampling).long()[:, None] + pen_x.to(pixel_x.device)
+        sub_y = (pixel_y * supersampling).long()[:, None] + pen_y.to(pixel_y.device)
+        sub_x = sub_x.clamp(0, width * supersampling - 1)
+        sub_y = sub_y.clamp(0, height * supersampling - 1)
+        return torch.unique(sub_y * (width * supersampling) + sub_x)
+
+    def _plot_antialiased_sub_pixels(self, sub_pixels: torch.Tensor) -> None:
+        supersampling = self.draw_options.supersampling
+        width = self.image.options.size[0]
+
+        sub_y = sub_pixels // (width * supersampling)
+        sub_x = sub_pixels % (width * supersampling)
+
+        pixels, hits = torch.unique(
+            (sub_y // supersampling) * width + sub_x // supersampling,
+            return_counts=True,
+        )
+        flat_image = self.image.image.view(-1, 3)
+        flat_image[pixels] = _blend(
+            flat_image[pixels],
+            self.draw_options.draw_color,
+            hits / supersampling**2,
         )
 
+    def draw_batch(
+        self,
+        images: List[Canvas],
+        colors: List[Tuple[int]],
+        device: torch.device = torch.device("cpu"),
+    ) -> None:
+        # Draw one frame per image from a curve whose term broadcasts over a
+        # leading frame dimension (e.g. a parameter of shape (frames, 1, 1))
+        if not isinstance(self.curve, ImplicitFunctionGraph):
+            raise ValueError("Only implicit function graphs can be drawn in batch")
+        if not self._definition_interval_in_draw_interval():
+            raise ValueError(
+                "The definition interval of the implicit function graph is not in the draw interval"
+            )
+
+        if self.draw_options.levels is not None:
+            self._draw_levels(images, colors, device)
+            return
+
+        if self.draw_options.method == "contour":
+            x_grid, y_grid = self._get_implicit_grids(
+                device, self.draw_options.grid_step
+            )
+            for x_tile, y_tile in self._contour_tiles(
+                x_grid, y_grid, len(images) * x_grid.shape[1]
+            ):
+                values = self._contour_values(x_tile, y_tile)
+                for image, color, frame_values in zip(
+                    images, colors, values.expand(len(images), *x_tile.shape)
+                ):
+                    self._plot_contour(image, color, x_tile, y_tile, frame_values)
+            return
+
+        if self.draw_options.method == "adaptive":
+            raise ValueError("The adaptive method doesn't support batch drawing")
+
+        if self.draw_options.method == "heatmap":
+            self._draw_heatmap(images, device)
+            return
+
+        if self.draw_options.supersampling > 1:
+            self._draw_antialiased_implicit(images, colors, device)
+            return
+
+        x_grid, y_grid = self._get_implicit_grids(device)
+        for x_tile, y_tile in self._grid_tiles(
+            x_grid, y_grid, len(images) * x_grid.shape[1]
+        ):
+            masks = self._evaluate_mask(x_tile, y_tile).expand(
+                len(images), *x_tile.shape
+            )
+            for image, color, mask in zip(images, colors, masks):
+                self._plot_grid_mask(image, color, x_tile, y_tile, mask)
+
     def _draw_implicit_function_graph(self, device: torch.device) -> None:
+        if self.draw_options.levels is not None:
+            self._draw_levels([self.image], [self.draw_options.draw_color], device)
+            return
+
+        if self.draw_options.method == "contour":
+            x_grid, y_grid = self._get_implicit_grids(
+                device, self.draw_options.grid_step
+            )
+            for x_tile, y_tile in self._contour_tiles(x_grid, y_grid, x_grid.shape[1]):
+                self._plot_contour(
+                    self.image,
+                    self.draw_options.draw_color,
+                    x_tile,
+                    y_tile,
+                    self._contour_values(x_tile, y_tile),
+                )
+            return
+
+        if self.draw_options.method == "heatmap":
+            self._draw_heatmap([self.image], device)
+            return
+
+        if self.draw_options.supersampling > 1:
+            self._draw_antialiased_implicit(
+                [self.image], [self.draw_options.draw_color], device
+            )
+            return
+
+        x_grid, y_grid = self._get_implicit_grids(device)
+        if self.draw_options.method == "adaptive":
+            block_size = self.draw_options.grid_step
+            if block_size == 1:
+                # Blocks of a single sample evaluate the whole grid, like "sample"
+                raise ValueError(
+                    "The adaptive method needs a grid step above 1 for implicit function graphs"
+                )
+            for x_tile, y_tile in self._block_tiles(x_grid, y_grid, block_size):
+                with span("adaptive_mask"):
+                    mask = adaptive_mask(
+                        self.curve, x_tile[:, 0], y_tile[0, :], block_size
+                    )
+                self._plot_grid_mask(
+                    self.image, self.draw_options.draw_color, x_tile, y_tile, mask
+                )
+            return
+
+        for x_tile, y_tile in self._grid_tiles(x_grid, y_grid, x_grid.shape[1]):
+            self._plot_grid_mask(
+                self.image,
+                self.draw_options.draw_color,
+                x_tile,
+                y_tile,
+                self._evaluate_mask(x_tile, y_tile),
+            )
+
+    def _draw_antialiased_implicit(
+        self,
+        images: List[Canvas],
+        colors: List[Tuple[int]],
+        device: torch.device,
+    ) -> None:
+        # The window is rendered tile by tile so only one supersampled tile
+        # lives in memory at a time
         scale = self._calculate_scale()
         offset = self._calculate_offset(scale)
+        supersampling = self.draw_options.supersampling
+        x_range, y_range = self._get_draw_ranges()
+        width, height = self.image.options.size
+
+        pixel_x_min, pixel_x_max = (
+            max(0, int(x_range[0] * scale[0] + offset[0])),
+            min(width, int(x_range[1] * scale[0] + offset[0]) + 1),
+        )
+        pixel_y_min, pixel_y_max = (
+            max(0, int(y_range[0] * scale[1] + offset[1])),
+            min(height, int(y_range[1] * scale[1] + offset[1]) + 1),
+        )
+
+        # Thick lines dilate the coverage, tiles are evaluated with a margin
+        # wide enough for the pen to reach them from their neighbours
+        line_width = self.draw_options.line_width
+        margin = line_width if line_width > 1 else 0
+        tile_size = self._antialiasing_tile_size(len(images), margin)
+
+        for tile_y in range(pixel_y_min, pixel_y_max, tile_size):
+            tile_y_end = min(tile_y + tile_size, pixel_y_max)
+            eval_y, eval_y_end = (
+                max(pixel_y_min, tile_y - margin),
+                min(pixel_y_max, tile_y_end + margin),
+            )
+            t_y = self._sub_pixel_centers(
+                eval_y, eval_y_end, scale[1], offset[1], device
+            )
+
+            for tile_x in range(pixel_x_min, pixel_x_max, tile_size):
+                tile_x_end = min(tile_x + tile_size, pixel_x_max)
+                eval_x, eval_x_end = (
+                    max(pixel_x_min, tile_x - margin),
+                    min(pixel_x_max, tile_x_end + margin),
+                )
+                t_x = self._sub_pixel_centers(
+                    eval_x, eval_x_end, scale[0], offset[0], device
+                )
+
+                x_grid, y_grid = torch.meshgrid(t_x, t_y, indexing="ij")
+                inside = (
+                    (x_grid >= x_range[0])
+                    & (x_grid <= x_range[1])
+                    & (y_grid >= y_range[0])
+                    & (y_grid <= y_range[1])
+                )
+                covered = self._evaluate_mask(x_grid, y_grid) & inside
+
+                # (frames, x sub-pixels, y sub-pixels) -> (frames, y pixels, x pixels)
+                with span("coverage"):
+                    coverage = (
+                        covered.expand(len(images), *x_grid.shape)
+                        .unflatten(2, (-1, supersampling))
+                        .unflatten(1, (-1, supersampling))
+                        .float()
+                        .mean(dim=(2, 4))
+                        .transpose(1, 2)
+                    )
+                    coverage = disc_dilate(coverage, line_width)[
+                        :,
+                        tile_y - eval_y : tile_y_end - eval_y,
+                        tile_x - eval_x : tile_x_end - eval_x,
+                    ].cpu()
+
+                with span("blend"):
+                    for image, color, frame_coverage in zip(images, colors, coverage):
+                        tile = image.image[tile_y:tile_y_end, tile_x:tile_x_end]
+                        tile.copy_(_blend(tile, color, frame_coverage))
+
+    def _draw_levels(
+        self, images: List[Canvas], colors: List[Tuple[int]], device: torch.device
+    ) -> None:
+        # The term is evaluated once for all the levels. A pixel takes the
+        # color of the highest level covering it, as if the levels had been
+        # drawn one after the other in increasing order.
+        line_width = self.draw_options.line_width
+
+        if self.draw_options.method == "contour":
+            # The contour pixels of every frame are gathered across the tiles,
+            # keeping the highest level of each, then composited at once
+            x_grid, y_grid = self._get_implicit_grids(
+                device, self.draw_options.grid_step
+            )
+            frame_pixels = [None] * len(images)
+            for x_tile, y_tile in self._contour_tiles(
+                x_grid, y_grid, len(images) * x_grid.shape[1]
+            ):
+                values = self._contour_values(x_tile, y_tile)
+                for frame_index, frame_values in enumerate(
+                    values.expand(len(images), *x_tile.shape)
+                ):
+                    frame_pixels[frame_index] = self._contour_level_pixels(
+                        x_tile, y_tile, frame_values, frame_pixels[frame_index]
+                    )
+            for image, color, (pixels, layers) in zip(images, colors, frame_pixels):
+                self._plot_level_pixels(
+                    image, self._level_colors(color), pixels, layers
+                )
+            return
+
+        # Tiles own whole pixel columns, thick lines are dilated with the
+        # columns their pen reaches from the neighbouring tiles
+        x_grid, y_grid = self._get_implicit_grids(device)
+        for x_tile, y_tile, (column_min, column_max) in self._grid_margin_tiles(
+            x_grid,
+            y_grid,
+            len(images) * x_grid.shape[1],
+            line_width if line_width > 1 else 0,
+        ):
+            with span("term"):
+                values = self.curve.term(x_tile, y_tile)
+            with span("mask"):
+                layers = self._level_layers(values.expand(len(images), *x_tile.shape))
+            for image, color, frame_layers in zip(images, colors, layers):
+                window_layers, window = self._grid_window(
+                    image, x_tile, y_tile, frame_layers
+                )
+                with span("scatter"):
+                    window_layers, (x_min, x_max, y_min, y_max) = self._dilate_window(
+                        image, window_layers, window, line_width
+                    )
+                    left, right = max(x_min, column_min), min(x_max, column_max)
+                    if left < right:
+                        self._composite_layers(
+                            image,
+                            self._level_colors(color),
+                            window_layers[:, left - x_min : right - x_min],
+                            (left, right, y_min, y_max),
+                        )
+
+    def _level_layers(self, values: torch.Tensor) -> torch.Tensor:
+        """
+        1 + the index of the highest level whose equation holds for each
+        value, 0 if none.
+
+        The levels whose equations hold form a run of consecutive levels, up
+        to the last one for "<". For "=" and ">" the run ends before the first
+        level c for which values - c > bound no longer holds: that count is
+        estimated with bucketize, then corrected with the same comparisons as
+        satisfied so that rounding can't pick a different level.
+        """
+        levels = torch.tensor(
+            self.draw_options.levels, dtype=values.dtype, device=values.device
+        )
+        if self.curve.sign == "<":
+            index = torch.full(
+                values.shape, len(levels) - 1, dtype=torch.long, device=values.device
+            )
+        else:
+            bound = (
+                -self.curve.tolerance
+                if self.curve.sign == "="
+                else self.curve.tolerance
+            )
+            count = torch.bucketize(values - bound, levels).masked_fill_(
+                values.isnan(), 0
+            )
+            while True:
+                grow = (count < len(levels)) & (
+                    values - levels[count.clamp(max=len(levels) - 1)] > bound
+                )
+                shrink = (count > 0) & ~(
+                    values - levels[(count - 1).clamp(min=0)] > bound
+                )
+                if not (grow.any() or shrink.any()):
+                    break
+                count += grow.long() - shrink.long()
+            index = (count - 1).clamp(min=0)
+        return torch.where(
+            self.curve.satisfied(values - levels[index]), index + 1, 0
+        ).to(torch.int32)
+
+    def _level_colors(self, color: Tuple[int]) -> List[Tuple[int]]:
+        return self.draw_options.level_colors or [color] * len(self.draw_options.levels)
+
+    def _draw_heatmap(self, images: List[Canvas], device: torch.device) -> None:
+        # The values of the term are normalized over the window and drawn
+        # through the colormap. Without a value range and with several tiles,
+        # the tiles are evaluated a first time to find the range of each frame.
+        x_grid, y_grid = self._get_implicit_grids(device)
+        tiles = self._grid_tiles(x_grid, y_grid, len(images) * x_grid.shape[1])
+
+        values = None
+        if self.draw_options.value_range is not None:
+            low, high = (
+                torch.full((len(images),), bound, device=device)
+                for bound in self.draw_options.value_range
+            )
+        else:
+            low = torch.full((len(images),), torch.inf, device=device)
+            high = torch.full((len(images),), -torch.inf, device=device)
+            for x_tile, y_tile in tiles:
+                values = self._heatmap_values(x_tile, y_tile, len(images))
+                with span("normalize"):
+                    finite = values.isfinite()
+                    low = torch.minimum(
+                        low, torch.where(finite, values, torch.inf).amin(dim=(1, 2))
+                    )
+                    high = torch.maximum(
+                        high, torch.where(finite, values, -torch.inf).amax(dim=(1, 2))
+                    )
+
+        colormap = self.draw_options.colormap
+        for x_tile, y_tile in tiles:
+            if values is None or len(tiles) > 1:
+                values = self._heatmap_values(x_tile, y_tile, len(images))
+
+            # layers hold 1 + the colormap index of each sample, 0 where the
+            # term isn't finite
+            with span("normalize"):
+                frame_low, frame_high = low[:, None, None], high[:, None, None]
+                normalized = (
+                    (values - frame_low)
+                    / torch.where(frame_high > frame_low, frame_high - frame_low, 1)
+                ).clamp(0, 1)
+                layers = torch.where(
+                    values.isfinite(),
+                    (normalized * (len(colormap) - 1)).round().long() + 1,
+                    0,
+                )
+
+            for image, frame_layers in zip(images, layers):
+                self._plot_grid_layers(image, colormap, x_tile, y_tile, frame_layers)
+
+    def _heatmap_values(
+        self, x_grid: torch.Tensor, y_grid: torch.Tensor, frames: int
+    ) -> torch.Tensor:
+        # (frames, x samples, y samples)
+        with span("term"):
+            values = self.curve.term(x_grid, y_grid)
+        return _pixel_precision(values.expand(frames, *x_grid.shape))
+
+    def _sample_chunks(
+        self, count: int, samples_per_item: int = 1
+    ) -> List[Tuple[int, int]]:
+        # Chunks of the count items, each costing up to samples_per_item samples
+        memory_budget = self.image.options.memory_budget
+        if memory_budget is None:
+            return [(0, count)]
+
+        chunk_size = max(
+            SAMPLE_CHUNK_ALIGNMENT,
+            memory_budget
+            // (BYTES_PER_SAMPLE * samples_per_item)
+            // SAMPLE_CHUNK_ALIGNMENT
+            * SAMPLE_CHUNK_ALIGNMENT,
+        )
+        return [
+            (start, min(start + chunk_size, count))
+            for start in range(0, count, chunk_size)
+        ]
+
+    def _grid_tiles(
+        self, x_grid: torch.Tensor, y_grid: torch.Tensor, samples_per_row: int
+    ) -> List[Tuple[torch.Tensor, torch.Tensor]]:
+        """
+        Split the grids along x into tiles fitting the memory budget, each
+        row of the grids costing samples_per_row samples.
+
+        Tiles only break between pixel columns so every pixel is composited
+        from a single tile, exactly as from the whole grid.
+        """
+        if self.image.options.memory_budget is None:
+            return [(x_grid, y_grid)]
+
+        _, row_ranges = self._grid_tile_rows(x_grid, samples_per_row)
+        return [(x_grid[start:end], y_grid[start:end]) for start, end in row_ranges]
+
+    def _grid_margin_tiles(
+        self,
+        x_grid: torch.Tensor,
+        y_grid: torch.Tensor,
+        samples_per_row: int,
+        margin: int,
+    ) -> List[Tuple[torch.Tensor, torch.Tensor, Tuple[int, int]]]:
+        """
+        _grid_tiles, each tile also holding the rows of the margin pixel
+        columns on either side of it, with the (x_min, x_max) pixel columns
+        the tile owns. The first and last tiles own the columns up to the
+        borders of the image, which a pen may reach beyond the grids.
+        """
+        width = self.image.options.size[0]
+        if self.image.options.memory_budget is None:
+            return [(x_grid, y_grid, (0, width))]
+
+        pixel_x, row_ranges = self._grid_tile_rows(x_grid, samples_per_row)
+        tiles = []
+        for start, end in row_ranges:
+            x_min, x_max = pixel_x[start].item(), pixel_x[end - 1].item() + 1
+            margin_start = torch.searchsorted(
+                pixel_x, x_min - margin, side="left"
+            ).item()
+            margin_end = torch.searchsorted(
+                pixel_x, x_max - 1 + margin, side="right"
+            ).item()
+            tiles.append(
+                (
+                    x_grid[margin_start:margin_end],
+                    y_grid[margin_start:margin_end],
+                    (
+                        0 if start == 0 else x_min,
+                        width if end == len(pixel_x) else x_max,
+                    ),
+                )
+            )
+        return tiles
+
+    def _grid_tile_rows(
+        self, x_grid: torch.Tensor, samples_per_row: int
+    ) -> Tuple[torch.Tensor, List[Tuple[int, int]]]:
+        # Pixel column of every row of the grids and the (start, end) rows of
+        # the tiles
+        scale = self._calculate_scale()
+        offset = self._calculate_offset(scale)
+        pixel_x = (
+            ((_pixel_precision(x_grid[:, 0]) * scale[0]) + offset[0])
+            .long()
+            .clamp(0, self.image.options.size[0] - 1)
+        )
+        # First row of every pixel column
+        column_starts = (
+            torch.nonzero(pixel_x[1:] != pixel_x[:-1]).flatten().cpu() + 1
+        ).tolist() + [len(pixel_x)]
+
+        rows_per_tile = max(
+            1,
+            self.image.options.memory_budget // (BYTES_PER_SAMPLE * samples_per_row),
+        )
+        row_ranges = []
+        start = 0
+        while start < len(pixel_x):
+            # Last column start fitting the budget, or the next one if even a
+            # single column doesn't fit
+            end = column_starts[bisect_right(column_starts, start + rows_per_tile) - 1]
+            if end <= start:
+                end = column_starts[bisect_right(column_starts, start)]
+            row_ranges.append((start, end))
+            start = end
+        return pixel_x, row_ranges
+
+    def _block_tiles(
+        self, x_grid: torch.Tensor, y_grid: torch.Tensor, block_size: int
+    ) -> List[Tuple[torch.Tensor, torch.Tensor]]:
+        # Tiles of whole rows of quadtree blocks, the blocks and so the mask
+        # are the same as on the whole grids
+        memory_budget = self.image.options.memory_budget
+        if memory_budget is None:
+            return [(x_grid, y_grid)]
+
+        rows_per_tile = block_size * max(
+            1, memory_budget // (BYTES_PER_SAMPLE * x_grid.shape[1] * block_size)
+        )
+        return [
+            (
+                x_grid[start : start + rows_per_tile],
+                y_grid[start : start + rows_per_tile],
+            )
+            for start in range(0, len(x_grid), rows_per_tile)
+        ]
+
+    def _contour_tiles(
+        self, x_grid: torch.Tensor, y_grid: torch.Tensor, samples_per_row: int
+    ) -> List[Tuple[torch.Tensor, torch.Tensor]]:
+        # Tiles of cells, neighbouring tiles share their boundary samples
+        memory_budget = self.image.options.memory_budget
+        if memory_budget is None:
+            return [(x_grid, y_grid)]
+
+        cells_per_tile = max(
+            1, memory_budget // (BYTES_PER_SAMPLE * samples_per_row) - 1
+        )
+        return [
+            (
+                x_grid[start : start + cells_per_tile + 1],
+                y_grid[start : start + cells_per_tile + 1],
+            )
+            for start in range(0, len(x_grid) - 1, cells_per_tile)
+        ]
+
+    def _antialiasing_tile_size(self, frames: int, margin: int) -> int:
+        memory_budget = self.image.options.memory_budget
+        if memory_budget is None:
+            return ANTIALIASING_TILE_SIZE
+
+        # A tile and its margins are evaluated supersampling^2 times per pixel
+        samples_per_pixel = frames * self.draw_options.supersampling**2
+        side = int((memory_budget / (BYTES_PER_SAMPLE * samples_per_pixel)) ** 0.5)
+        return max(1, min(ANTIALIASING_TILE_SIZE, side - 2 * margin))
+
+    def _sub_pixel_centers(
+        self,
+        pixel_min: int,
+        pixel_max: int,
+        scale: float,
+        offset: float,
+        device: torch.device,
+    ) -> torch.Tensor:
+        supersampling = self.draw_options.supersampling
+        sub_pixels = torch.arange(
+            pixel_min * supersampling,
+            pixel_max * supersampling,
+            device=device,
+            dtype=torch.promote_types(self.dtype, torch.float32),
+        )
+        # Computed in at least single precision, then rounded to the dtype
+        return (((sub_pixels + 0.5) / supersampling - offset) / scale).to(self.dtype)
+
+    def _contour_values(
+        self, x_grid: torch.Tensor, y_grid: torch.Tensor
+    ) -> torch.Tensor:
+        if self.curve.sign != "=":
+            raise ValueError(
+                'The contour method only supports implicit function graphs with the "=" sign'
+            )
+        with span("term"):
+            return self.curve.term(x_grid, y_grid)
+
+    def _evaluate_mask(
+        self, x_grid: torch.Tensor, y_grid: torch.Tensor
+    ) -> torch.Tensor:
+        with span("term"):
+            values = self.curve.term(x_grid, y_grid)
+        with span("mask"):
+            return self.curve.satisfied(values)
+
+    def _get_implicit_grids(
+        self, device: torch.device, grid_step: int = 1
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
         intersect_size = self._intersect_draw_interval_image_size()
 
         x_range, y_range = self._get_draw_ranges()
-        print(
-            f"x between {x_range[0]} and {x_range[1]}, y between {y_range[0]} and {y_range[1]}"
-        )
-        t_x, t_y = (
-            torch.linspace(*x_range, round(intersect_size[0]), device=device),
-            torch.linspace(*y_range, round(intersect_size[1]), device=device),
+        with span("grid"):
+            return coordinate_grids(
+                tuple(x_range),
+                tuple(y_range),
+                (
+                    max(2, round(intersect_size[0] / grid_step)),
+                    max(2, round(intersect_size[1] / grid_step)),
+                ),
+                device,
+                self.dtype,
+            )
+
+    def _plot_grid_mask(
+        self,
+        image: Canvas,
+        color: Tuple[int],
+        x_grid: torch.Tensor,
+        y_grid: torch.Tensor,
+        mask: torch.Tensor,
+    ) -> None:
+        window_mask, (x_min, x_max, y_min, y_max) = self._grid_window(
+            image, x_grid, y_grid, mask
         )
-        x_grid, y_grid = torch.meshgrid(t_x, t_y, indexing="ij")
-        mask = self.curve.equation(x_grid, y_grid)
 
-        pixel_x = ((x_grid[mask] * scale[0]) + offset[0]).long()
-        pixel_y = ((y_grid[mask] * scale[1]) + offset[1]).long()
+        with span("scatter"):
+            window_mask, (x_min, x_max, y_min, y_max) = self._dilate_window(
+                image,
+                window_mask,
+                (x_min, x_max, y_min, y_max),
+                self.draw_options.line_width,
+            )
+            image.image[y_min:y_max, x_min:x_max][window_mask.cpu()] = torch.tensor(
+                color, dtype=torch.uint8
+            )
+
+    def _plot_grid_layers(
+        self,
+        image: Canvas,
+        colors: Union[List[Tuple[int]], torch.Tensor],
+        x_grid: torch.Tensor,
+        y_grid: torch.Tensor,
+        layers: torch.Tensor,
+    ) -> None:
+        # layers[i, j] is 1 + the index of the last color covering the sample,
+        # 0 if none. A pixel takes the color of the last layer among its
+        # samples, as if the layers had been plotted one after the other.
+        window_layers, window = self._grid_window(image, x_grid, y_grid, layers)
 
-        pixel_x = pixel_x.clamp(0, self.image.options.size[0] - 1)
-        pixel_y = pixel_y.clamp(0, self.image.options.size[1] - 1)
+        with span("scatter"):
+            self._composite_layers(image, colors, window_layers, window)
 
-        self.image.image[pixel_y, pixel_x] = torch.tensor(
-            self.draw_options.draw_color, dtype=torch.uint8
+    def _composite_layers(
+        self,
+        image: Canvas,
+        colors: Union[List[Tuple[int]], torch.Tensor],
+        window_layers: torch.Tensor,
+        window: Tuple[int, int, int, int],
+    ) -> None:
+        x_min, x_max, y_min, y_max = window
+        window_layers = window_layers.cpu()
+        covered = window_layers > 0
+        image.image[y_min:y_max, x_min:x_max][covered] = _palette(colors)[
+            window_layers[covered]
+        ]
+
+    def _dilate_window(
+        self,
+        image: Canvas,
+        window_values: torch.Tensor,
+        window: Tuple[int, int, int, int],
+        line_width: int,
+    ) -> Tuple[torch.Tensor, Tuple[int, int, int, int]]:
+        # Thick lines: the bounding box of the covered pixels grows by the pen
+        # on every side, within the image, before being dilated. Layers are
+        # dilated by their maximum so the last one still wins.
+        if line_width <= 1:
+            return window_values, window
+        x_min, x_max, y_min, y_max = window
+
+        covered = window_values != 0
+        rows = covered.any(dim=1).nonzero().flatten()
+        columns = covered.any(dim=0).nonzero().flatten()
+        if len(rows) == 0:
+            return window_values[:0, :0], (x_min, x_min, y_min, y_min)
+        row_min, row_max = rows[0].item(), rows[-1].item() + 1
+        column_min, column_max = columns[0].item(), columns[-1].item() + 1
+        window_values = window_values[row_min:row_max, column_min:column_max]
+        x_min, x_max = x_min + column_min, x_min + column_max
+        y_min, y_max = y_min + row_min, y_min + row_max
+
+        width, height = image.options.size
+        left, top = min(x_min, line_width), min(y_min, line_width)
+        right = min(width - x_max, line_width)
+        bottom = min(height - y_max, line_width)
+        padded = torch.zeros(
+            (y_max - y_min + top + bottom, x_max - x_min + left + right),
+            dtype=window_values.dtype,
+            device=window_values.device,
+        )
+        padded[top : top + y_max - y_min, left : left + x_max - x_min] = window_values
+        return disc_dilate(padded, line_width), (
+            x_min - left,
+            x_max + right,
+            y_min - top,
+            y_max + bottom,
         )
 
+    def _grid_window(
+        self,
+        image: Canvas,
+        x_grid: torch.Tensor,
+        y_grid: torch.Tensor,
+        values: torch.Tensor,
+    ) -> Tuple[torch.Tensor, Tuple[int, int, int, int]]:
+        """
+        Reduce values sampled on the grids to the window of pixels they fall
+        in, keeping the maximum of the samples of each pixel.
+
+        Returns the (rows, columns) window and its (x_min, x_max, y_min, y_max)
+        bounds. A grid sampled exactly once per pixel, the usual case, maps
+        one-to-one onto the window and its values are only transposed from
+        the "ij" layout.
+        """
+        values = values.expand(x_grid.shape)
+        scale = self._calculate_scale()
+        offset = self._calculate_offset(scale)
+
+        with span("pixel_mapping"):
+            pixel_x = ((_pixel_precision(x_grid[:, 0]) * scale[0]) + offset[0]).long()
+            pixel_y = ((_pixel_precision(y_grid[0, :]) * scale[1]) + offset[1]).long()
+
+            pixel_x = pixel_x.clamp(0, image.options.size[0] - 1)
+            pixel_y = pixel_y.clamp(0, image.options.size[1] - 1)
+
+            x_min, x_max = pixel_x.min().item(), pixel_x.max().item() + 1
+            y_min, y_max = pixel_y.min().item(), pixel_y.max().item() + 1
+            window = (x_min, x_max, y_min, y_max)
+
+            if (
+                x_max - x_min == len(pixel_x)
+                and y_max - y_min == len(pixel_y)
+                and bool((pixel_x.diff() == 1).all())
+                and bool((pixel_y.diff() == 1).all())
+            ):
+                return values.T, window
+
+        with span("scatter"):
+            window_pixels = (pixel_y - y_min)[None, :] * (x_max - x_min) + (
+                pixel_x - x_min
+            )[:, None]
+            window_values = torch.zeros(
+                (y_max - y_min) * (x_max - x_min),
+                dtype=values.dtype,
+                device=values.device,
+            )
+            window_values.scatter_reduce_(
+                0, window_pixels.flatten(), values.flatten(), "amax"
+            )
+            return window_values.view(y_max - y_min, x_max - x_min), window
+
+    def _plot_contour(
+        self,
+        image: Canvas,
+        color: Tuple[int],
+        x_grid: torch.Tensor,
+        y_grid: torch.Tensor,
+        values: torch.Tensor,
+    ) -> None:
+        scale = self._calculate_scale()
+        offset = self._calculate_offset(scale)
+
+        with span("contour"):
+            x0, y0, x1, y1 = (
+                _pixel_precision(coordinates)
+                for coordinates in contour_segments(values, x_grid, y_grid)
+            )
+        with span("rasterize"):
+            pixel_x, pixel_y = rasterize_segments(
+                (x0 * scale[0]) + offset[0],
+                (y0 * scale[1]) + offset[1],
+                (x1 * scale[0]) + offset[0],
+                (y1 * scale[1]) + offset[1],
+            )
+
+        self._plot_pixels(image, color, pixel_x, pixel_y)
+
+    def _contour_level_pixels(
+        self,
+        x_grid: torch.Tensor,
+        y_grid: torch.Tensor,
+        values: torch.Tensor,
+        previous: Optional[Tuple[torch.Tensor, torch.Tensor]],
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        # Flat indices of the pixels crossed by the contours of the levels and
+        # 1 + the index of the highest level of each, merged with the pixels of
+        # the previous tiles
+        scale = self._calculate_scale()
+        offset = self._calculate_offset(scale)
+        width, height = self.image.options.size
+
+        with span("contour"):
+            *coordinates, level_index = contour_level_segments(
+                values,
+                x_grid,
+                y_grid,
+                torch.tensor(
+                    self.draw_options.levels, dtype=values.dtype, device=values.device
+                ),
+            )
+            x0, y0, x1, y1 = (
+                _pixel_precision(coordinate) for coordinate in coordinates
+            )
+        with span("rasterize"):
+            pixel_x, pixel_y, layers = rasterize_labeled_segments(
+                (x0 * scale[0]) + offset[0],
+                (y0 * scale[1]) + offset[1],
+                (x1 * scale[0]) + offset[0],
+                (y1 * scale[1]) + offset[1],
+                (level_index + 1).to(torch.int32),
+            )
+        with span("scatter"):
+            pixels = pixel_y.clamp(0, height - 1) * width + pixel_x.clamp(0, width - 1)
+            if previous is not None:
+                pixels = torch.cat((previous[0], pixels))
+                layers = torch.cat((previous[1], layers))
+            pixels, inverse = torch.unique(pixels, return_inverse=True)
+            return pixels, torch.zeros_like(pixels, dtype=torch.int32).scatter_reduce_(
+                0, inverse, layers, "amax"
+            )
+
+    def _plot_level_pixels(
+        self,
+        image: Canvas,
+        colors: List[Tuple[int]],
+        pixels: torch.Tensor,
+        layers: torch.Tensor,
+    ) -> None:
+        # Each pixel is given once, with the highest level covering it
+        width = image.options.size[0]
+        pixel_x, pixel_y = pixels % width, pixels // width
+        with span("scatter"):
+            if self.draw_options.line_width <= 1:
+                image.image.view(-1, 3)[pixels.cpu()] = _palette(colors)[layers.cpu()]
+                return
+
+            if len(pixels) == 0:
+                return
+            # Thick lines: the levels are gathered in the bounding box of the
+            # pixels, which is dilated and composited at once
+            x_min, x_max = pixel_x.min().item(), pixel_x.max().item() + 1
+            y_min, y_max = pixel_y.min().item(), pixel_y.max().item() + 1
+            window_layers = torch.zeros(
+                (y_max - y_min, x_max - x_min), dtype=torch.int32, device=pixels.device
+            )
+            window_layers[pixel_y - y_min, pixel_x - x_min] = layers
+            self._composite_layers(
+                image,
+                colors,
+                *self._dilate_window(
+                    image,
+                    window_layers,
+                    (x_min, x_max, y_min, y_max),
+                    self.draw_options.line_width,
+                ),
+            )
+
+    def _plot_pixels(
+        self,
+        image: Canvas,
+        color: Tuple[int],
+        pixel_x: torch.Tensor,
+        pixel_y: torch.Tensor,
+    ) -> None:
+        with span("scatter"):
+            # Clamp pixel coordinates to image bounds
+            pixel_x = pixel_x.clamp(0, image.options.size[0] - 1)
+            pixel_y = pixel_y.clamp(0, image.options.size[1] - 1)
+
+            line_width = self.draw_options.line_width
+            if line_width <= 1 or len(pixel_x) == 0:
+                image.image[pixel_y, pixel_x] = torch.tensor(color, dtype=torch.uint8)
+                return
+
+            # Thick lines: the points are gathered in a mask covering their
+            # bounding box plus the pen, which is dilated and composited at once
+            width, height = image.options.size
+            x_min = max(0, pixel_x.min().item() - line_width)
+            x_max = min(width, pixel_x.max().item() + line_width + 1)
+            y_min = max(0, pixel_y.min().item() - line_width)
+            y_max = min(height, pixel_y.max().item() + line_width + 1)
+
+            mask = torch.zeros(
+                (y_max - y_min, x_max - x_min), dtype=torch.bool, device=pixel_x.device
+            )
+            mask[pixel_y - y_min, pixel_x - x_min] = True
+            mask = disc_dilate(mask, line_width).cpu()
+
+            image.image[y_min:y_max, x_min:x_max][mask] = torch.tensor(
+                color, dtype=torch.uint8
+            )
+
     def _definition_interval_in_draw_interval(self) -> bool:
         def_x_min, def_x_max, def_y_min, def_y_max = self.curve_bounds
         img_x_min, img_x_max, img_y_min, img_y_max = self.image_bounds
@@ -141,3 +1178,87 @@ class Drawer:
             (max(def_x_min, img_x_min), min(def_x_max, img_x_max)),
             (max(def_y_min, img_y_min), min(def_y_max, img_y_max)),
         )
+
+
+def draw_fused(
+    drawers: List[Drawer],
+    device: torch.device = torch.device("cpu"),
+    images: List[Canvas] = None,
+    colors: List[List[Tuple[int]]] = None,
+) -> None:
+    """
+    Draw implicit function graphs sharing the same fusion_key in one pass.
+
+    All the equations are evaluated on the shared grid and their masks are
+    composited into the canvas in draw order with a single write, giving the
+    same pixels as drawing them one after the other.
+
+    Like draw_batch, the terms may broadcast over a leading frame dimension,
+    drawing one frame per image of images with colors[i][j] the color of
+    drawers[i] on images[j].
+    """
+    for drawer in drawers:
+        if not drawer._definition_interval_in_draw_interval():
+            raise ValueError(
+                "The definition interval of the implicit function graph is not in the draw interval"
+            )
+
+    first = drawers[0]
+    if images is None:
+        images = [first.image]
+        colors = [[drawer.draw_options.draw_color] for drawer in drawers]
+
+    x_grid, y_grid = first._get_implicit_grids(device)
+    for x_tile, y_tile in first._grid_tiles(
+        x_grid, y_grid, len(drawers) * len(images) * x_grid.shape[1]
+    ):
+        # (drawers, frames, x samples, y samples)
+        masks = torch.stack(
+            [
+                mask.expand(len(images), *x_tile.shape)
+                for mask in _evaluate_equations(
+                    [drawer.curve for drawer in drawers], x_tile, y_tile
+                )
+            ]
+        )
+        # 1 + index of the last mask covering each sample, 0 if none
+        with span("mask"):
+            layers = (
+                masks.to(torch.int32)
+                * torch.arange(
+                    1, len(drawers) + 1, dtype=torch.int32, device=masks.device
+                )[:, None, None, None]
+            ).amax(dim=0)
+
+        for frame_index, (image, frame_layers) in enumerate(zip(images, layers)):
+            first._plot_grid_layers(
+                image,
+                [drawer_colors[frame_index] for drawer_colors in colors],
+                x_tile,
+                y_tile,
+                frame_layers,
+            )
+
+
+def _evaluate_equations(
+    curves: List[ImplicitFunctionGraph], x_grid: torch.Tensor, y_grid: torch.Tensor
+) -> List[torch.Tensor]:
+    # Expression terms sharing their variables are evaluated with one plan so
+    # their common sub-expressions are computed once
+    expressions = {}
+    for curve in curves:
+        if isinstance(curve.term, Expression):
+            expressions.setdefault(curve.term.variables, []).append(curve.term)
+    values = {}
+    with span("term"):
+        for group in expressions.values():
+            for term, term_values in zip(
+                group, evaluate_expressions(group, x_grid, y_grid)
+            ):
+                values[id(term)] = term_values
+        for curve in curves:
+            if not isinstance(curve.term, Expression):
+                values[id(curve.term)] = curve.term(x_grid, y_grid)
+
+    with span("mask"):
+        return [curve.satisfied(values[id(curve.term)]) for curve in curves]
@@ -0,0 +1,199 @@
+from dataclasses import fields, is_dataclass
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+import hashlib
+import os
+import types
+
+import numpy as np
+import torch
+
+# Bump when a change of the renderer changes the pixels of existing frames
+CACHE_VERSION = 1
+
+
+class FrameCache:
+    """
+    Rendered frames stored on disk under the hash of everything they depend on.
+
+    When the files exceed max_size bytes, the least recently used frames are
+    evicted.
+    """
+
+    def __init__(self, directory: Union[str, Path], max_size: int = None) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        self._sizes: Dict[str, int] = {}
+        for path in sorted(
+            self.directory.glob("*.npy"), key=lambda path: path.stat().st_mtime
+        ):
+            self._sizes[path.stem] = path.stat().st_size
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._sizes
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        if key not in self._sizes:
+            self.misses += 1
+            return None
+        path = self._path(key)
+        try:
+            frame = np.load(path)
+        except (OSError, ValueError):
+            # Evicted by another process or truncated, render it again
+            self._sizes.pop(key)
+            self.misses += 1
+            return None
+        os.utime(path)
+        self._sizes[key] = self._sizes.pop(key)  # most recently used last
+        self.hits += 1
+        return frame
+
+    def put(self, key: str, frame: np.ndarray) -> None:
+        # A frame stored because it wasn't cached was rendered on a miss, even
+        # when the caller only checked `in` instead of calling get
+        if key not in self._sizes:
+            self.misses += 1
+
+        # Written under a temporary name so an interrupted render never leaves
+        # a partial frame behind
+        path = self._path(key)
+        temporary_path = path.with_suffix(".tmp")
+        with open(temporary_path, "wb") as file:
+            np.save(file, frame)
+        os.replace(temporary_path, path)
+
+        self._sizes.pop(key, None)
+        self._sizes[key] = path.stat().st_size
+        self._evict()
+
+    def _evict(self) -> None:
+        if self.max_size is None:
+            return
+        total_size = sum(self._sizes.values())
+        for key in list(self._sizes):
+            if total_size <= self.max_size:
+                return
+            total_size -= self._sizes.pop(key)
+            self._path(key).unlink(missing_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.npy"
+
+
+def fingerprint(*objects: Any) -> str:
+    """
+    Hash of objects by content. Functions are hashed through their code, the
+    values they close over and the globals they use, so editing a curve's
+    lambda or one of the functions it calls changes the fingerprint.
+    """
+    hasher = hashlib.sha256(str(CACHE_VERSION).encode())
+    for obj in objects:
+        _update(hasher, obj, set())
+    return hasher.hexdigest()
+
+
+def _update(hasher: "hashlib._Hash", obj: Any, seen: set) -> None:
+    def write(*parts: Any) -> None:
+        for part in parts:
+            hasher.update(part if isinstance(part, bytes) else repr(part).encode())
+            hasher.update(b"\0")
+
+    if obj is None or isinstance(obj, (bool, int, float, complex, str, bytes)):
+        write(type(obj).__name__, obj)
+        return
+    if isinstance(obj, (torch.dtype, torch.device)):
+        write(type(obj).__name__, str(obj))
+        return
+    if isinstance(obj, types.ModuleType):
+        write("module", obj.__name__)
+        return
+    if isinstance(obj, type):
+        write("type", obj.__module__, obj.__qualname__)
+        return
+    if isinstance(obj, (types.BuiltinFunctionType, types.BuiltinMethodType)):
+        write("builtin", getattr(obj, "__module__", None), obj.__qualname__)
+        return
+
+    # Containers and functions can be recursive
+    if id(obj) in seen:
+        write("cycle")
+        return
+    seen = seen | {id(obj)}
+
+    if isinstance(obj, torch.Tensor):
+        _update(hasher, obj.detach().cpu().numpy(), seen)
+    elif isinstance(obj, np.ndarray):
+        write("array", obj.dtype.str, obj.shape, np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, (list, tuple)):
+        write(type(obj).__name__, len(obj))
+        for item in obj:
+            _update(hasher, item, seen)
+    elif isinstance(obj, (set, frozenset)):
+        # Iterated in an order that depends on PYTHONHASHSEED, the items are
+        # hashed on their own and written in the order of their digests
+        write(type(obj).__name__, len(obj))
+        for digest in sorted(_digest(item, seen) for item in obj):
+            write(digest)
+    elif isinstance(obj, dict):
+        write("dict", len(obj))
+        for key, value in sorted(obj.items(), key=lambda item: repr(item[0])):
+            _update(hasher, key, seen)
+            _update(hasher, value, seen)
+    elif isinstance(obj, types.CodeType):
+        write("code", obj.co_code, obj.co_names, obj.co_varnames, obj.co_freevars)
+        for constant in obj.co_consts:
+            _update(hasher, constant, seen)
+    elif isinstance(obj, types.FunctionType):
+        write("function")
+        _update(hasher, obj.__code__, seen)
+        _update(hasher, obj.__defaults__, seen)
+        _update(hasher, obj.__kwdefaults__, seen)
+        for cell in obj.__closure__ or ():
+            try:
+                _update(hasher, cell.cell_contents, seen)
+            except ValueError:  # empty cell
+                write("empty cell")
+        for name in sorted(_global_names(obj.__code__)):
+            if name in obj.__globals__:
+                write(name)
+                _update(hasher, obj.__globals__[name], seen)
+    elif isinstance(obj, types.MethodType):
+        write("method")
+        _update(hasher, obj.__func__, seen)
+        _update(hasher, obj.__self__, seen)
+    elif isinstance(obj, partial):
+        write("partial")
+        _update(hasher, (obj.func, obj.args, obj.keywords), seen)
+    elif is_dataclass(obj):
+        write("dataclass", type(obj).__qualname__)
+        for field in fields(obj):
+            write(field.name)
+            _update(hasher, getattr(obj, field.name), seen)
+    elif hasattr(obj, "__dict__"):
+        write("object", type(obj).__module__, type(obj).__qualname__)
+        _update(hasher, vars(obj), seen)
+    else:
+        # Unknown values are hashed by repr, which may include their address
+        # and then simply never hit the cache
+        write("repr", type(obj).__qualname__, obj)
+
+
+def _digest(obj: Any, seen: set) -> bytes:
+    hasher = hashlib.sha256()
+    _update(hasher, obj, seen)
+    return hasher.digest()
+
+
+def _global_names(code: types.CodeType) -> set:
+    # Names a function and the functions nested in it may load from globals
+    names = set(code.co_names)
+    for constant in code.co_consts:
+        if isinstance(constant, types.CodeType):
+            names |= _global_names(constant)
+    return names
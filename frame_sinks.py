@@ -0,0 +1,242 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Deque, Optional, Protocol, Tuple, Union
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+import cv2
+
+from tracing import span
+
+
+class FrameSink(Protocol):
+    # Receives the RGB frames of an animation, in order
+    def write(self, name: str, frame: np.ndarray) -> None: ...
+
+    def release(self) -> None: ...
+
+
+class VideoSink:
+    def __init__(
+        self,
+        output_file_name: str,
+        FPS: int,
+        resolution: Tuple[int],
+        fourcc: str = "MJPG",
+    ) -> None:
+        self.resolution = resolution
+        self.out = cv2.VideoWriter(
+            output_file_name, cv2.VideoWriter_fourcc(*fourcc), FPS, resolution
+        )
+
+    def write(self, name: str, frame: np.ndarray) -> None:
+        # The frame is given explicitly, this may run on the encoder thread
+        with span("color_conversion", frame=name):
+            img = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        if img is None:
+            print(f"Warning : image could not be read.")
+            return
+        if img.size != self.resolution:
+            with span("resize", frame=name):
+                img = cv2.resize(img, self.resolution)
+        with span("encode", frame=name):
+            self.out.write(img)
+
+    def release(self) -> None:
+        self.out.release()
+
+
+@dataclass
+class EncoderStats:
+    frames: int = 0
+    max_queue_depth: int = 0
+    total_queue_depth: int = 0  # sum of the queue depths seen by each write
+    blocked_writes: int = 0  # writes that had to wait for a free slot
+    blocked_time: float = 0.0  # seconds the producer spent waiting
+    encode_time: float = 0.0  # seconds the encoder thread spent writing
+
+    @property
+    def mean_queue_depth(self) -> float:
+        return self.total_queue_depth / self.frames if self.frames else 0.0
+
+
+class BackgroundSink:
+    """
+    Feed frames to a sink from a dedicated thread through a bounded queue.
+
+    `write` only blocks when `queue_size` frames are already waiting, so the
+    color conversion, resizing and encoding done by the wrapped sink overlap
+    with the rendering of the next frames.
+    """
+
+    _STOP = object()
+
+    def __init__(self, sink: FrameSink, queue_size: int = 8) -> None:
+        if queue_size < 1:
+            raise ValueError("Queue size must be at least 1")
+        self.sink = sink
+        self.stats = EncoderStats()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._encode, daemon=True)
+        self._thread.start()
+
+    def write(self, name: str, frame: np.ndarray) -> None:
+        self._raise_encoder_error()
+
+        depth = self._queue.qsize()
+        self.stats.frames += 1
+        self.stats.total_queue_depth += depth
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, depth)
+
+        try:
+            self._queue.put_nowait((name, frame))
+        except queue.Full:
+            self.stats.blocked_writes += 1
+            start = time.perf_counter()
+            self._queue.put((name, frame))
+            self.stats.blocked_time += time.perf_counter() - start
+
+    def release(self) -> EncoderStats:
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self.sink.release()
+        self._raise_encoder_error()
+        return self.stats
+
+    def _encode(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            if self._error is not None:
+                # Keep draining so the producer never blocks on a dead encoder
+                continue
+            start = time.perf_counter()
+            try:
+                self.sink.write(*item)
+            except BaseException as error:
+                self._error = error
+            self.stats.encode_time += time.perf_counter() - start
+
+    def _raise_encoder_error(self) -> None:
+        if self._error is not None:
+            raise RuntimeError("The background encoder failed") from self._error
+
+
+class PngSequenceSink:
+    """
+    Write every frame to its own lossless PNG file in directory, named after
+    pattern formatted with the index of the frame in the sequence.
+
+    Frames are compressed in parallel by a pool of threads, at most
+    max_pending frames wait for compression at a time.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        pattern: str = "frame_{index:06d}.png",
+        workers: int = None,
+        compression: int = 3,
+        max_pending: int = None,
+    ) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.pattern = pattern
+        self.compression = compression
+        self.index = 0
+        workers = workers or os.cpu_count()
+        self.max_pending = max_pending or 2 * workers
+        self._pool = ThreadPoolExecutor(workers)
+        self._pending: Deque[Future] = deque()
+
+    def write(self, name: str, frame: np.ndarray) -> None:
+        while len(self._pending) >= self.max_pending:
+            self._pending.popleft().result()
+        path = self.directory / self.pattern.format(index=self.index, name=name)
+        self._pending.append(self._pool.submit(self._write_png, name, path, frame))
+        self.index += 1
+
+    def release(self) -> None:
+        try:
+            while self._pending:
+                self._pending.popleft().result()
+        finally:
+            self._pool.shutdown()
+
+    def _write_png(self, name: str, path: Path, frame: np.ndarray) -> None:
+        with span("color_conversion", frame=name):
+            img = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        # OpenCV releases the GIL while compressing
+        with span("encode", frame=name):
+            written = cv2.imwrite(
+                str(path), img, [cv2.IMWRITE_PNG_COMPRESSION, self.compression]
+            )
+        if not written:
+            raise OSError(f"Could not write {path}")
+
+
+class RawPipeSink:
+    """
+    Stream the frames as raw rgb24 bytes, one after the other, to stdout
+    ("-"), a named pipe or any binary file, e.g. for
+    `ffmpeg -f rawvideo -pix_fmt rgb24 -s WxH -r FPS -i - out.mp4`.
+    """
+
+    def __init__(self, target: Union[str, BinaryIO] = "-") -> None:
+        self._owned = False
+        if target == "-":
+            self.stream = sys.stdout.buffer
+        elif isinstance(target, (str, Path)):
+            # Opening a named pipe blocks until the reader opens it too
+            self.stream = open(target, "wb")
+            self._owned = True
+        else:
+            self.stream = target
+        self.frame_shape: Optional[Tuple[int, ...]] = None
+
+    def write(self, name: str, frame: np.ndarray) -> None:
+        if self.frame_shape is None:
+            self.frame_shape = frame.shape
+        elif frame.shape != self.frame_shape:
+            raise ValueError("Every frame of a raw stream must have the same size")
+        with span("encode", frame=name):
+            self.stream.write(np.ascontiguousarray(frame, dtype=np.uint8).data)
+
+    def release(self) -> None:
+        self.stream.flush()
+        if self._owned:
+            self.stream.close()
+
+
+class NpyMemmapSink:
+    """
+    Write the frames into a preallocated .npy file of shape
+    (frames, height, width, 3), readable with np.load(path, mmap_mode="r").
+    """
+
+    def __init__(
+        self, path: Union[str, Path], frames: int, size: Tuple[int, int]
+    ) -> None:
+        self.frames = np.lib.format.open_memmap(
+            path, mode="w+", dtype=np.uint8, shape=(frames, size[1], size[0], 3)
+        )
+        self.index = 0
+
+    def write(self, name: str, frame: np.ndarray) -> None:
+        if self.index >= len(self.frames):
+            raise ValueError(f"The file only holds {len(self.frames)} frames")
+        with span("encode", frame=name):
+            self.frames[self.index] = frame
+        self.index += 1
+
+    def release(self) -> None:
+        self.frames.flush()
+        del self.frames
@@ -1,3 +1,4 @@
+from .expression import Expression, evaluate_expressions
 from .parametric_curve import ParametricCurve
 from .function_curve import FunctionCurve
 from .polar_equation_curve import PolarCurve
@@ -0,0 +1,313 @@
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+import ast
+import copy
+import math
+import operator
+
+import torch
+
+_BINARY_OPERATORS = {
+    ast.Add: ("add", operator.add),
+    ast.Sub: ("sub", operator.sub),
+    ast.Mult: ("mul", operator.mul),
+    ast.Div: ("truediv", operator.truediv),
+    ast.Pow: ("pow", operator.pow),
+    ast.Mod: ("mod", operator.mod),
+}
+_UNARY_OPERATORS = {
+    ast.USub: ("neg", operator.neg),
+    ast.UAdd: ("pos", operator.pos),
+}
+_FUNCTIONS = {
+    "sin": torch.sin,
+    "cos": torch.cos,
+    "tan": torch.tan,
+    "arcsin": torch.arcsin,
+    "arccos": torch.arccos,
+    "arctan": torch.arctan,
+    "arctan2": torch.arctan2,
+    "sinh": torch.sinh,
+    "cosh": torch.cosh,
+    "tanh": torch.tanh,
+    "exp": torch.exp,
+    "log": torch.log,
+    "log2": torch.log2,
+    "log10": torch.log10,
+    "sqrt": torch.sqrt,
+    "abs": torch.abs,
+    "floor": torch.floor,
+    "ceil": torch.ceil,
+    "round": torch.round,
+    "sign": torch.sign,
+    "deg2rad": torch.deg2rad,
+    "rad2deg": torch.rad2deg,
+    "hypot": torch.hypot,
+    "max": torch.maximum,
+    "min": torch.minimum,
+}
+# The functions of _FUNCTIONS taking two arguments, the other ones take one
+_BINARY_FUNCTIONS = {"arctan2", "hypot", "max", "min"}
+# Operations whose result doesn't depend on the order of their operands
+_COMMUTATIVE = {"add", "mul", "hypot", "max", "min"}
+_CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau}
+
+Value = Union[torch.Tensor, float]
+
+
+class Expression:
+    """
+    A term written as a math expression string, e.g. "sin(x) ** 2 - y".
+
+    Args:
+        source: The expression, using +, -, *, /, **, %, numbers, the functions
+            of _FUNCTIONS, pi, e, tau and the names below
+        variables: The names of the arguments the expression is called with
+        definitions: Named sub-expressions the source and the other
+            definitions can refer to
+        params: Named values (numbers or tensors) fixed for this expression,
+            e.g. the animation parameter
+
+    Expressions evaluated together by evaluate_expressions share every
+    identical sub-expression, which is computed once.
+    """
+
+    # Wraps the plan the expression is evaluated with, see compiled
+    compile_function: Optional[Callable[[Callable], Callable]] = None
+
+    def __init__(
+        self,
+        source: str,
+        variables: Sequence[str] = ("x", "y"),
+        definitions: Dict[str, str] = None,
+        params: Dict[str, Value] = None,
+    ) -> None:
+        self.source = source
+        self.variables = tuple(variables)
+        self.definitions = dict(definitions or {})
+        self.params = dict(params or {})
+
+        # Parse everything now so syntax errors show up where the curve is defined
+        _parse(source)
+        for definition in self.definitions.values():
+            _parse(definition)
+
+    def __call__(self, *values: torch.Tensor) -> torch.Tensor:
+        return evaluate_expressions([self], *values)[0]
+
+    def compiled(
+        self, compile_function: Callable[[Callable], Callable]
+    ) -> "Expression":
+        """
+        Copy of the expression whose evaluation plan, shared with the
+        expressions it is evaluated with, is run through compile_function.
+        """
+        expression = copy.copy(self)
+        expression.compile_function = compile_function
+        return expression
+
+    def __repr__(self) -> str:
+        return f"Expression({self.source!r})"
+
+
+def evaluate_expressions(
+    expressions: List[Expression], *values: torch.Tensor
+) -> List[torch.Tensor]:
+    """
+    Evaluate several expressions on the same variable values with a single
+    plan, computing their common sub-expressions once.
+    """
+    variables = expressions[0].variables
+    for expression in expressions:
+        if expression.variables != variables:
+            raise ValueError("Expressions evaluated together must share variables")
+    if len(values) != len(variables):
+        raise ValueError(f"Expected values for {', '.join(variables)}")
+
+    plan = _Plan(len(variables))
+    outputs = [plan.lower_expression(expression) for expression in expressions]
+
+    # The whole plan is compiled as soon as one of its expressions is
+    run = plan.run
+    for expression in expressions:
+        if expression.compile_function is not None:
+            run = expression.compile_function(plan.run)
+            break
+    return run(values, outputs)
+
+
+class _Plan:
+    # A DAG of operations in evaluation order, each identical operation on
+    # identical operands is only added once
+
+    def __init__(self, variable_count: int) -> None:
+        self.steps: List[Tuple[Callable, Tuple[int], Value]] = []
+        self._step_indices: Dict[Tuple, int] = {}
+        for index in range(variable_count):
+            self._add(("variable", index), None, (), None)
+
+    def lower_expression(self, expression: Expression) -> int:
+        scope = {name: index for index, name in enumerate(expression.variables)}
+        for name, value in expression.params.items():
+            # Tensors are only known to be equal when they are the same object
+            key = (
+                ("param", id(value))
+                if isinstance(value, torch.Tensor)
+                else ("constant", type(value), value)
+            )
+            scope[name] = self._add(key, None, (), value)
+        return self._lower(_parse(expression.source), expression, scope, [])
+
+    def run(self, values: Sequence[torch.Tensor], outputs: List[int]) -> List[Value]:
+        # Each intermediate result is released after its last use
+        last_uses = {}
+        for index, (_, operands, _) in enumerate(self.steps):
+            for operand in operands:
+                last_uses[operand] = index
+        for output in outputs:
+            last_uses[output] = len(self.steps)
+        releases = [[] for _ in self.steps]
+        for operand, index in last_uses.items():
+            if index < len(self.steps):
+                releases[index].append(operand)
+
+        results: List[Value] = [None] * len(self.steps)
+        for index, (function, operands, value) in enumerate(self.steps):
+            if index < len(values):
+                results[index] = values[index]
+            elif function is None:
+                results[index] = value
+            else:
+                results[index] = function(*[results[operand] for operand in operands])
+            for operand in releases[index]:
+                results[operand] = None
+        return [results[output] for output in outputs]
+
+    def _add(
+        self, key: Tuple, function: Callable, operands: Tuple[int], value: Value
+    ) -> int:
+        if key not in self._step_indices:
+            self._step_indices[key] = len(self.steps)
+            self.steps.append((function, operands, value))
+        return self._step_indices[key]
+
+    def _lower(
+        self,
+        node: ast.AST,
+        expression: Expression,
+        scope: Dict[str, int],
+        definition_stack: List[str],
+    ) -> int:
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return self._add(
+                ("constant", type(node.value), node.value), None, (), node.value
+            )
+
+        if isinstance(node, ast.Name):
+            return self._lower_name(node.id, expression, scope, definition_stack)
+
+        lower = lambda child: self._lower(child, expression, scope, definition_stack)
+
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+            name, function = _BINARY_OPERATORS[type(node.op)]
+            return self._add_operation(
+                name, function, (lower(node.left), lower(node.right))
+            )
+
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+            name, function = _UNARY_OPERATORS[type(node.op)]
+            return self._add_operation(name, function, (lower(node.operand),))
+
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id in _FUNCTIONS
+            and not node.keywords
+        ):
+            return self._add_operation(
+                node.func.id,
+                _tensor_function(_FUNCTIONS[node.func.id]),
+                tuple(lower(argument) for argument in node.args),
+            )
+
+        raise ValueError(f"Unsupported syntax in expression: {ast.unparse(node)}")
+
+    def _lower_name(
+        self,
+        name: str,
+        expression: Expression,
+        scope: Dict[str, int],
+        definition_stack: List[str],
+    ) -> int:
+        if name in scope:
+            return scope[name]
+        if name in expression.definitions:
+            if name in definition_stack:
+                raise ValueError(f"Recursive definition of {name}")
+            # Definitions are inlined, the plan merges their repeated uses
+            return self._lower(
+                _parse(expression.definitions[name]),
+                expression,
+                scope,
+                definition_stack + [name],
+            )
+        if name in _CONSTANTS:
+            return self._add(
+                ("constant", float, _CONSTANTS[name]), None, (), _CONSTANTS[name]
+            )
+        raise ValueError(f"Unknown name in expression: {name}")
+
+    def _add_operation(
+        self, name: str, function: Callable, operands: Tuple[int]
+    ) -> int:
+        key_operands = tuple(sorted(operands)) if name in _COMMUTATIVE else operands
+        return self._add((name, *key_operands), function, operands, None)
+
+
+@lru_cache(maxsize=256)
+def _parse(source: str) -> ast.AST:
+    try:
+        node = ast.parse(source.strip(), mode="eval").body
+    except SyntaxError as error:
+        raise ValueError(f"Invalid expression: {source}") from error
+
+    # torch would only reject a wrong argument count once evaluated
+    for call in ast.walk(node):
+        if (
+            isinstance(call, ast.Call)
+            and isinstance(call.func, ast.Name)
+            and call.func.id in _FUNCTIONS
+        ):
+            arity = 2 if call.func.id in _BINARY_FUNCTIONS else 1
+            if len(call.args) != arity:
+                raise ValueError(
+                    f"Wrong number of arguments in expression: {ast.unparse(call)}"
+                )
+    return node
+
+
+@lru_cache(maxsize=None)
+def _tensor_function(function: Callable) -> Callable:
+    # torch functions don't accept plain numbers, e.g. cos(pi) or max(x, 0), they
+    # are converted to the dtype and device of the first tensor operand. The
+    # wrappers are shared between plans so compiled plans reuse their kernels.
+    def call(*arguments: Value) -> torch.Tensor:
+        tensor = None
+        for argument in arguments:
+            if isinstance(argument, torch.Tensor):
+                tensor = argument
+                break
+        dtype = torch.get_default_dtype() if tensor is None else tensor.dtype
+        device = None if tensor is None else tensor.device
+        return function(
+            *[
+                (
+                    argument
+                    if isinstance(argument, torch.Tensor)
+                    else torch.as_tensor(argument, dtype=dtype, device=device)
+                )
+                for argument in arguments
+            ]
+        )
+
+    return call
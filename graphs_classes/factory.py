@@ -11,34 +11,49 @@ from graphs_classes import (
     PolarCurve,
 )
 
+# A static factory returns the same curve whatever the parameter, make_animation
+# then rasterizes it once instead of once per frame
+
 
 class FunctionCurveFactory:
-    def __init__(self, factory: Callable[[float], FunctionCurve]) -> None:
+    def __init__(
+        self, factory: Callable[[float], FunctionCurve], static: bool = False
+    ) -> None:
         self.factory = factory
+        self.static = static
 
     def __call__(self, param: float) -> ParametricCurve:
         return self.factory(param).to_parametric()
 
 
 class PolarCurveFactory:
-    def __init__(self, factory: Callable[[float], PolarCurve]) -> None:
+    def __init__(
+        self, factory: Callable[[float], PolarCurve], static: bool = False
+    ) -> None:
         self.factory = factory
+        self.static = static
 
     def __call__(self, param: float) -> ParametricCurve:
         return self.factory(param).to_parametric()
 
 
 class ParametricCurveFactory:
-    def __init__(self, factory: Callable[[float], ParametricCurve]) -> None:
+    def __init__(
+        self, factory: Callable[[float], ParametricCurve], static: bool = False
+    ) -> None:
         self.factory = factory
+        self.static = static
 
     def __call__(self, param: float) -> ParametricCurve:
         return self.factory(param)
 
 
 class ImplicitFunctionGraphFactory:
-    def __init__(self, factory: Callable[[float], ImplicitFunctionGraph]) -> None:
+    def __init__(
+        self, factory: Callable[[float], ImplicitFunctionGraph], static: bool = False
+    ) -> None:
         self.factory = factory
+        self.static = static
 
     def __call__(self, param: float) -> ImplicitFunctionGraph:
         return self.factory(param)
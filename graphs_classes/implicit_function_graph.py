@@ -1,13 +1,15 @@
 from dataclasses import dataclass
-from typing import Callable, List
+from typing import Callable, List, Union
 import torch
 
+from .expression import Expression
+
 
 @dataclass
 class ImplicitFunctionGraph:
-    term: Callable[
-        [torch.Tensor, torch.Tensor], torch.Tensor
-    ]  # the left term of an equation whose right term is 0
+    # the left term of an equation whose right term is 0, a string is parsed
+    # as an Expression of x and y
+    term: Union[Callable[[torch.Tensor, torch.Tensor], torch.Tensor], str]
     sign: str  # must be in ["=", "<", ">"]
     tolerance: float
     interval_bounds: List[List[float]]
@@ -15,25 +17,18 @@ class ImplicitFunctionGraph:
     def __post_init__(self) -> None:
         if self.sign not in ["=", "<", ">"]:
             raise ValueError("Invalid sign type")
+        if isinstance(self.term, str):
+            self.term = Expression(self.term, ("x", "y"))
 
     @property
     def equation(self) -> Callable[[torch.Tensor], torch.Tensor]:
+        return lambda t_x, t_y: self.satisfied(self.term(t_x, t_y))
+
+    def satisfied(self, values: torch.Tensor) -> torch.Tensor:
+        # values of the term -> whether the equation holds
         if self.sign == "=":
-            return lambda t_x, t_y: torch.where(
-                torch.abs(self.term(t_x, t_y))
-                < torch.full_like(t_x, fill_value=self.tolerance),
-                True,
-                False,
-            )
+            return torch.abs(values) < self.tolerance
         elif self.sign == "<":
-            return lambda t_x, t_y: torch.where(
-                self.term(t_x, t_y) < torch.full_like(t_x, fill_value=self.tolerance),
-                True,
-                False,
-            )
+            return values < self.tolerance
         elif self.sign == ">":
-            return lambda t_x, t_y: torch.where(
-                self.term(t_x, t_y) > torch.full_like(t_x, fill_value=self.tolerance),
-                True,
-                False,
-            )
+            return values > self.tolerance
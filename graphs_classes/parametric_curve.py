@@ -1,12 +1,21 @@
-from typing import List, Callable
+from typing import List, Callable, Union
 from dataclasses import dataclass
 import torch
 
+from .expression import Expression
+
 
 @dataclass
 class ParametricCurve:
     interval_bounds: List[float]
     draw_interval_bounds: List[List[float]]
-    x_func: Callable[[torch.Tensor], torch.Tensor]
-    y_func: Callable[[torch.Tensor], torch.Tensor]
+    # a string is parsed as an Expression of t
+    x_func: Union[Callable[[torch.Tensor], torch.Tensor], str]
+    y_func: Union[Callable[[torch.Tensor], torch.Tensor], str]
     precision: int
+
+    def __post_init__(self) -> None:
+        if isinstance(self.x_func, str):
+            self.x_func = Expression(self.x_func, ("t",))
+        if isinstance(self.y_func, str):
+            self.y_func = Expression(self.y_func, ("t",))
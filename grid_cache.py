@@ -0,0 +1,25 @@
+from functools import lru_cache
+from typing import Tuple
+import torch
+
+
+@lru_cache(maxsize=8)
+def coordinate_grids(
+    x_range: Tuple[float, float],
+    y_range: Tuple[float, float],
+    size: Tuple[int, int],
+    device: torch.device,
+    dtype: torch.dtype = torch.float32,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Coordinate grids of size[0] x size[1] samples spanning x_range and y_range,
+    built with indexing="ij".
+
+    The grids are shared by every drawer and frame asking for the same window,
+    they must never be modified in place.
+    """
+    t_x, t_y = (
+        torch.linspace(*x_range, size[0], device=device, dtype=dtype),
+        torch.linspace(*y_range, size[1], device=device, dtype=dtype),
+    )
+    return torch.meshgrid(t_x, t_y, indexing="ij")
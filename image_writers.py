@@ -0,0 +1,186 @@
+from typing import List, Tuple, Union
+import struct
+import zlib
+
+import numpy as np
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_TIFF_SHORT = 3
+_TIFF_LONG = 4
+
+
+class PngStripWriter:
+    """
+    Encode an RGB image into a PNG file strip by strip.
+
+    Rows are compressed as they are written, only the compressor state and
+    the current strip are held in memory.
+    """
+
+    def __init__(self, path: str, size: Tuple[int, int], compression: int = 6) -> None:
+        self.size = size
+        self.rows_written = 0
+        self._file = open(path, "wb")
+        self._compressor = zlib.compressobj(compression)
+
+        self._file.write(_PNG_SIGNATURE)
+        # 8 bits per channel, truecolor, deflate, no interlacing
+        self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", *size, 8, 2, 0, 0, 0))
+
+    def write_rows(self, rows: np.ndarray) -> None:
+        _check_rows(rows, self.size, self.rows_written)
+        # Every scanline starts with its filter type, 0 for none
+        filtered = np.zeros((rows.shape[0], 1 + rows.shape[1] * 3), dtype=np.uint8)
+        filtered[:, 1:] = rows.reshape(rows.shape[0], -1)
+        self._write_chunk(b"IDAT", self._compressor.compress(filtered.tobytes()))
+        self.rows_written += rows.shape[0]
+
+    def close(self) -> None:
+        if self.rows_written != self.size[1]:
+            self._file.close()
+            raise ValueError(
+                f"Only {self.rows_written} of the {self.size[1]} rows were written"
+            )
+        self._write_chunk(b"IDAT", self._compressor.flush())
+        self._write_chunk(b"IEND", b"")
+        self._file.close()
+
+    def _write_chunk(self, chunk_type: bytes, data: bytes) -> None:
+        if chunk_type == b"IDAT" and not data:
+            return
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type))))
+
+
+class TiffStripWriter:
+    """
+    Write an RGB image into an uncompressed baseline TIFF file strip by strip.
+
+    The strips are written as soon as they are complete, the directory
+    listing them is appended when the writer is closed.
+    """
+
+    def __init__(
+        self, path: str, size: Tuple[int, int], rows_per_strip: int = 64
+    ) -> None:
+        if size[0] * size[1] * 3 >= 2**32:
+            raise ValueError("Baseline TIFF files are limited to 4 GB")
+        self.size = size
+        self.rows_per_strip = rows_per_strip
+        self.rows_written = 0
+        self._file = open(path, "wb")
+        self._pending: List[np.ndarray] = []
+        self._pending_rows = 0
+        self._strip_offsets: List[int] = []
+        self._strip_byte_counts: List[int] = []
+
+        # Little endian header, the directory offset is filled in by close
+        self._file.write(b"II*\x00" + struct.pack("<I", 0))
+
+    def write_rows(self, rows: np.ndarray) -> None:
+        _check_rows(rows, self.size, self.rows_written)
+        self.rows_written += rows.shape[0]
+        self._pending.append(np.ascontiguousarray(rows))
+        self._pending_rows += rows.shape[0]
+
+        # Every strip but the last one holds exactly rows_per_strip rows
+        while self._pending_rows >= self.rows_per_strip:
+            pending = np.concatenate(self._pending)
+            self._write_strip(pending[: self.rows_per_strip])
+            self._pending = [pending[self.rows_per_strip :]]
+            self._pending_rows -= self.rows_per_strip
+
+    def close(self) -> None:
+        if self.rows_written != self.size[1]:
+            self._file.close()
+            raise ValueError(
+                f"Only {self.rows_written} of the {self.size[1]} rows were written"
+            )
+        if self._pending_rows:
+            self._write_strip(np.concatenate(self._pending))
+
+        bits_per_sample_offset = self._write_array("<3H", (8, 8, 8))
+        strip_offsets_offset = self._write_array(
+            f"<{len(self._strip_offsets)}I", self._strip_offsets
+        )
+        strip_byte_counts_offset = self._write_array(
+            f"<{len(self._strip_byte_counts)}I", self._strip_byte_counts
+        )
+
+        # Tags must be sorted by code
+        strips = len(self._strip_offsets)
+        entries = [
+            (256, _TIFF_LONG, 1, self.size[0]),  # ImageWidth
+            (257, _TIFF_LONG, 1, self.size[1]),  # ImageLength
+            (258, _TIFF_SHORT, 3, bits_per_sample_offset),  # BitsPerSample
+            (259, _TIFF_SHORT, 1, 1),  # Compression: none
+            (262, _TIFF_SHORT, 1, 2),  # PhotometricInterpretation: RGB
+            (
+                273,
+                _TIFF_LONG,
+                strips,
+                strip_offsets_offset if strips > 1 else self._strip_offsets[0],
+            ),  # StripOffsets
+            (277, _TIFF_SHORT, 1, 3),  # SamplesPerPixel
+            (278, _TIFF_LONG, 1, self.rows_per_strip),  # RowsPerStrip
+            (
+                279,
+                _TIFF_LONG,
+                strips,
+                strip_byte_counts_offset if strips > 1 else self._strip_byte_counts[0],
+            ),  # StripByteCounts
+            (284, _TIFF_SHORT, 1, 1),  # PlanarConfiguration: chunky
+        ]
+
+        directory_offset = self._align()
+        self._file.write(struct.pack("<H", len(entries)))
+        for tag, field_type, count, value in entries:
+            if field_type == _TIFF_SHORT and count == 1:
+                self._file.write(
+                    struct.pack("<HHIHH", tag, field_type, count, value, 0)
+                )
+            else:
+                self._file.write(struct.pack("<HHII", tag, field_type, count, value))
+        self._file.write(struct.pack("<I", 0))  # no next directory
+
+        self._file.seek(4)
+        self._file.write(struct.pack("<I", directory_offset))
+        self._file.close()
+
+    def _write_strip(self, strip: np.ndarray) -> None:
+        data = strip.tobytes()
+        self._strip_offsets.append(self._file.tell())
+        self._strip_byte_counts.append(len(data))
+        self._file.write(data)
+
+    def _write_array(self, layout: str, values: Tuple[int]) -> int:
+        offset = self._align()
+        self._file.write(struct.pack(layout, *values))
+        return offset
+
+    def _align(self) -> int:
+        # Values referenced by offset must start on a word boundary
+        if self._file.tell() % 2:
+            self._file.write(b"\x00")
+        return self._file.tell()
+
+
+def strip_writer(
+    path: str, size: Tuple[int, int]
+) -> Union[PngStripWriter, TiffStripWriter]:
+    extension = path.lower().rsplit(".", 1)[-1]
+    if extension == "png":
+        return PngStripWriter(path, size)
+    elif extension in ["tif", "tiff"]:
+        return TiffStripWriter(path, size)
+    else:
+        raise ValueError(f"Unsupported streamed image format: .{extension}")
+
+
+def _check_rows(rows: np.ndarray, size: Tuple[int, int], rows_written: int) -> None:
+    if rows.dtype != np.uint8 or rows.ndim != 3 or rows.shape[1:] != (size[0], 3):
+        raise ValueError(f"Rows must be uint8 arrays of shape (rows, {size[0]}, 3)")
+    if rows_written + rows.shape[0] > size[1]:
+        raise ValueError(f"The image only has {size[1]} rows")
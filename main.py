@@ -1,11 +1,13 @@
+from itertools import groupby
 from typing import Dict, Union
-import timeit
 import torch
 
-from canvas import Canvas
-from drawer import Drawer
+from canvas import Canvas, MemmapCanvas
+from drawer import Drawer, draw_fused
 from options_classes import ImageOptions, DrawOptions
 from graphs_classes import ParametricCurve, ImplicitFunctionGraph
+from term_compiler import compile_curve
+from tracing import span
 
 
 def main(
@@ -14,22 +16,46 @@ def main(
     draw_options: Dict[str, DrawOptions],
     default_draw_options: DrawOptions = DrawOptions(1, (0, 0, 0)),
     device: torch.device = torch.device("cpu"),
+    compile_terms: bool = False,
 ) -> Canvas:
-
-    image = Canvas(
-        options=image_options,
+    image = create_canvas(image_options)
+    draw_curves(
+        image, curves, draw_options, default_draw_options, device, compile_terms
     )
+    return image
+
+
+def create_canvas(image_options: ImageOptions) -> Canvas:
+    if image_options.backing_file is not None:
+        return MemmapCanvas(options=image_options)
+    return Canvas(options=image_options)
+
+
+def draw_curves(
+    image: Canvas,
+    curves: Dict[str, Union[ParametricCurve, ImplicitFunctionGraph]],
+    draw_options: Dict[str, DrawOptions],
+    default_draw_options: DrawOptions = DrawOptions(1, (0, 0, 0)),
+    device: torch.device = torch.device("cpu"),
+    compile_terms: bool = False,
+) -> None:
+    if compile_terms:
+        curves = {name: compile_curve(curve) for name, curve in curves.items()}
 
     drawers = [
         Drawer(curve, draw_options.get(name, default_draw_options), image, name)
         for name, curve in curves.items()
     ]
 
-    for index, drawer in enumerate(drawers, 1):
-        print(f"Drawer {drawer.name} (n°{index}) started")
-        draw_timer = timeit.Timer(lambda: drawer.draw(device))
-        print(
-            f"Drawer {drawer.name} (n°{index}) took: {draw_timer.timeit(1):.6f} seconds\n"
-        )
+    # Consecutive implicit function graphs drawn on the same window are
+    # evaluated and composited together
+    for fusion_key, group in groupby(drawers, key=lambda drawer: drawer.fusion_key()):
+        group = list(group)
+        if fusion_key is not None and len(group) > 1:
+            with span("draw_fused"):
+                draw_fused(group, device)
+            continue
 
-    return image
+        for drawer in group:
+            with span("draw"):
+                drawer.draw(device)
@@ -1,7 +1,17 @@
-from typing import List, Union, Tuple
+from dataclasses import replace
+from functools import partial
+from itertools import groupby
+from typing import Callable, Iterator, List, Optional, Union, Tuple
+import multiprocessing
+import os
+import sys
+import numpy as np
 import torch
-import cv2
 
+from canvas import Canvas
+from drawer import Drawer, draw_fused
+from frame_cache import FrameCache, fingerprint
+from frame_sinks import BackgroundSink, EncoderStats, FrameSink, VideoSink
 from graphs_classes import (
     ImplicitFunctionGraphFactory,
     PolarCurveFactory,
@@ -9,33 +19,48 @@ from graphs_classes import (
     FunctionCurveFactory,
 )
 from options_classes import DrawOptions, ImageOptions
-from main import main
+from main import create_canvas, draw_curves
+from term_compiler import compile_curve
+from tracing import SpanEvent, frame, get_tracer, span
+
+Factory = Union[
+    ImplicitFunctionGraphFactory,
+    PolarCurveFactory,
+    ParametricCurveFactory,
+    FunctionCurveFactory,
+]
 
 
 def make_animation(
     bounds: List[float],
     num_steps: int,
-    factories: List[
-        Union[
-            ImplicitFunctionGraphFactory,
-            PolarCurveFactory,
-            ParametricCurveFactory,
-            FunctionCurveFactory,
-        ]
-    ],
+    factories: List[Factory],
     draw_options: List[DrawOptions],
     image_options: ImageOptions,
-    output_file_name: str,
+    output_file_name: Optional[str],
     resolution: Tuple[int] = None,
     FPS: int = 60,
     color_gradients: List[List[Tuple[int, int, int]]] = None,
     device: torch.device = torch.device("cpu"),
-) -> None:
+    batch_size: int = None,
+    workers: int = None,
+    threads_per_worker: int = 1,
+    encoder_queue_size: int = None,
+    compile_terms: bool = False,
+    frame_cache: FrameCache = None,
+    sink: FrameSink = None,
+    detect_static: bool = False,
+) -> Optional[EncoderStats]:
+    if batch_size is not None and batch_size < 1:
+        raise ValueError("Batch size must be at least 1")
+    if workers is not None and workers < 1:
+        raise ValueError("Number of workers must be at least 1")
 
-    fourcc = cv2.VideoWriter_fourcc(*"MJPG")
-    out = cv2.VideoWriter(
-        output_file_name, fourcc, FPS, resolution or image_options.size
-    )
+    # Without a sink, the frames are encoded to output_file_name with MJPG
+    out = sink or VideoSink(output_file_name, FPS, resolution or image_options.size)
+    if encoder_queue_size is not None:
+        # Color conversion, resizing and encoding run on their own thread
+        out = BackgroundSink(out, encoder_queue_size)
 
     param_values = torch.linspace(bounds[0], bounds[1], num_steps)
 
@@ -43,39 +68,465 @@ def make_animation(
         for color_gradient in color_gradients:
             assert len(color_gradient) == num_steps
 
-    for param_index, param in enumerate(param_values):
+    # The curves of static factories are rasterized once, before the workers
+    # are forked, and composited into every frame
+    static_layers = _static_layers(
+        param_values,
+        factories,
+        draw_options,
+        image_options,
+        device,
+        compile_terms,
+        detect_static,
+    )
+
+    render_frames = partial(
+        _render_frames,
+        param_values=param_values,
+        factories=factories,
+        draw_options=draw_options,
+        color_gradients=color_gradients,
+        image_options=image_options,
+        device=device,
+        batched=batch_size is not None,
+        compile_terms=compile_terms,
+        static_layers=static_layers,
+    )
+    # Implicit function graph factories get a parameter tensor of shape
+    # (batch_size, 1, 1) so their terms are evaluated for the whole batch in
+    # one pass, the other factories are still called once per frame
+    chunk_size = batch_size or 1
+    chunks = [
+        range(start, min(start + chunk_size, num_steps))
+        for start in range(0, num_steps, chunk_size)
+    ]
+
+    if frame_cache is None:
+        for name, pixels in _rendered_frames(
+            render_frames, chunks, workers, threads_per_worker
+        ):
+            out.write(name, pixels)
+        return out.release()
+
+    # Frames already in the cache are read back, the chunks only cover the
+    # runs of missing frames
+    frame_keys = _frame_keys(
+        param_values,
+        factories,
+        draw_options,
+        color_gradients,
+        image_options,
+        device,
+        compile_terms,
+    )
+    missing = [
+        param_index
+        for param_index, frame_key in enumerate(frame_keys)
+        if frame_key not in frame_cache
+    ]
+    missing_indices = set(missing)
+    # On stderr, stdout may be carrying the frames
+    print(
+        f"{num_steps - len(missing)} of the {num_steps} frames are cached",
+        file=sys.stderr,
+    )
+    chunks = [
+        range(start, min(start + chunk_size, stop))
+        for run_start, stop in _runs(missing)
+        for start in range(run_start, stop, chunk_size)
+    ]
+    rendered = _rendered_frames(render_frames, chunks, workers, threads_per_worker)
+
+    for param_index, frame_key in enumerate(frame_keys):
+        pixels = None
+        if param_index not in missing_indices:
+            pixels = frame_cache.get(frame_key)
+            if pixels is None:
+                # Evicted while rendering the missing frames
+                canvas = render_frames(range(param_index, param_index + 1))[0]
+                pixels = canvas.image.numpy()
+        if pixels is None:
+            _, pixels = next(rendered)
+            frame_cache.put(frame_key, pixels)
+        out.write(str(param_index), pixels)
+
+    return out.release()
+
+
+def _rendered_frames(
+    render_frames: Callable[[range], List[Canvas]],
+    chunks: List[range],
+    workers: Optional[int],
+    threads_per_worker: int,
+) -> Iterator[Tuple[str, np.ndarray]]:
+    if workers is None:
+        for chunk in chunks:
+            for image in render_frames(chunk):
+                yield image.name, image.image.numpy()
+        return
+
+    # Workers are forked so they inherit the factories, which are usually
+    # lambdas and can't be pickled. `imap` hands the chunks back in order.
+    with multiprocessing.get_context("fork").Pool(
+        workers,
+        initializer=_init_worker,
+        initargs=(render_frames, threads_per_worker),
+    ) as pool:
+        for frames, events in pool.imap(_render_frames_in_worker, chunks):
+            # The spans recorded by the workers join the trace of this process
+            tracer = get_tracer()
+            if tracer is not None:
+                tracer.events.extend(events)
+            yield from frames
+
+
+def _frame_keys(
+    param_values: torch.Tensor,
+    factories: List[Factory],
+    draw_options: List[DrawOptions],
+    color_gradients: List[List[Tuple[int, int, int]]],
+    image_options: ImageOptions,
+    device: torch.device,
+    compile_terms: bool,
+) -> List[str]:
+    # The fields that don't change the pixels are left out
+    image_fingerprint = fingerprint(
+        replace(image_options, name=None, memory_budget=None, backing_file=None)
+    )
+    # The factories are hashed once, each frame adds its parameter and options
+    scene_fingerprint = fingerprint(
+        factories, image_fingerprint, device.type, compile_terms
+    )
+    return [
+        fingerprint(
+            scene_fingerprint,
+            param_value.item(),
+            _frame_draw_options(draw_options, color_gradients, param_index),
+        )
+        for param_index, param_value in enumerate(param_values)
+    ]
+
+
+def _static_layers(
+    param_values: torch.Tensor,
+    factories: List[Factory],
+    draw_options: List[DrawOptions],
+    image_options: ImageOptions,
+    device: torch.device,
+    compile_terms: bool,
+    detect_static: bool,
+) -> List[Optional[torch.Tensor]]:
+    # Flat indices of the pixels drawn by each static factory, None for the
+    # factories drawn on every frame
+    layers = []
+    for factory, draw_option in zip(factories, draw_options):
+        # Anti-aliased pixels are blended with what is under them, heatmaps and
+        # levels have more than one color, they can't be reduced to a set of pixels
+        if (
+            draw_option.supersampling > 1
+            or draw_option.method == "heatmap"
+            or draw_option.levels is not None
+            or not (
+                factory.static or (detect_static and _is_static(factory, param_values))
+            )
+        ):
+            layers.append(None)
+            continue
+
+        curve = factory(param_values[0])
+        if compile_terms:
+            curve = compile_curve(curve)
+        # Drawn in white on black, the covered pixels are the non black ones
+        probe = Canvas(
+            options=replace(
+                image_options,
+                name=None,
+                background_color=(0, 0, 0),
+                show_axes=False,
+                backing_file=None,
+            )
+        )
+        with span("static_layer"):
+            Drawer(
+                curve, replace(draw_option, draw_color=(255, 255, 255)), probe, "static"
+            ).draw(device)
+            layers.append(probe.image.view(-1, 3).any(dim=1).nonzero().squeeze(1))
+    return layers
+
+
+def _is_static(factory: Factory, param_values: torch.Tensor) -> bool:
+    # Curves are compared by fingerprint, a curve whose functions close over
+    # the parameter gets a different one for every value
+    first = fingerprint(factory(param_values[0]))
+    return all(fingerprint(factory(param)) == first for param in param_values[1:])
+
+
+def _composite_static_layer(
+    image: Canvas, layer: torch.Tensor, color: Tuple[int]
+) -> None:
+    with span("composite"):
+        image.image.view(-1, 3)[layer] = torch.tensor(color, dtype=torch.uint8)
+
+
+def _frame_canvas(image_options: ImageOptions, slot: int) -> Canvas:
+    if image_options.backing_file is None:
+        return create_canvas(image_options)
+
+    # The workers and the frames of a batch are rendered at the same time, each
+    # of them maps its own file named after the backing file, the process and
+    # the slot of the frame in its batch. The file is unlinked once mapped so
+    # the next frame gets a new one, the pixels handed to the sinks stay backed
+    # by it until they are dropped.
+    root, extension = os.path.splitext(image_options.backing_file)
+    backing_file = f"{root}.{os.getpid()}.{slot}{extension}"
+    image = create_canvas(replace(image_options, backing_file=backing_file))
+    os.remove(backing_file)
+    return image
+
 
+def _runs(indices: List[int]) -> List[Tuple[int, int]]:
+    # (start, stop) of the runs of consecutive indices
+    runs = []
+    for index in indices:
+        if runs and runs[-1][1] == index:
+            runs[-1] = (runs[-1][0], index + 1)
+        else:
+            runs.append((index, index + 1))
+    return runs
+
+
+def _frame_draw_options(
+    draw_options: List[DrawOptions],
+    color_gradients: List[List[Tuple[int, int, int]]],
+    param_index: int,
+) -> List[DrawOptions]:
+    if color_gradients is None:
+        return draw_options
+    return [
+        replace(draw_option, draw_color=color_gradients[func_index][param_index])
+        for func_index, draw_option in enumerate(draw_options)
+    ]
+
+
+_worker_render_frames: Callable[[range], List[Canvas]] = None
+
+
+def _init_worker(
+    render_frames: Callable[[range], List[Canvas]], threads_per_worker: int
+) -> None:
+    global _worker_render_frames
+    _worker_render_frames = render_frames
+    torch.set_num_threads(threads_per_worker)
+    # Drop the spans inherited from the parent process
+    tracer = get_tracer()
+    if tracer is not None:
+        tracer.drain()
+
+
+def _render_frames_in_worker(
+    param_indices: range,
+) -> Tuple[List[Tuple[str, np.ndarray]], List[SpanEvent]]:
+    frames = [
+        (image.name, image.image.numpy())
+        for image in _worker_render_frames(param_indices)
+    ]
+    tracer = get_tracer()
+    return frames, tracer.drain() if tracer is not None else []
+
+
+def _render_frames(
+    param_indices: range,
+    param_values: torch.Tensor,
+    factories: List[Factory],
+    draw_options: List[DrawOptions],
+    color_gradients: List[List[Tuple[int, int, int]]],
+    image_options: ImageOptions,
+    device: torch.device,
+    batched: bool,
+    compile_terms: bool,
+    static_layers: List[Optional[torch.Tensor]],
+) -> List[Canvas]:
+    draw_options_per_frame = [
+        _frame_draw_options(draw_options, color_gradients, param_index)
+        for param_index in param_indices
+    ]
+
+    if batched:
+        with frame(f"{param_indices.start}-{param_indices.stop - 1}"):
+            return _render_batch(
+                param_indices,
+                param_values[param_indices.start : param_indices.stop],
+                factories,
+                draw_options_per_frame,
+                image_options,
+                device,
+                compile_terms,
+                static_layers,
+            )
+
+    images = []
+    for param_index, frame_draw_options in zip(param_indices, draw_options_per_frame):
         image_options.name = str(param_index)
+        with frame(str(param_index)):
+            images.append(
+                _render_frame(
+                    param_index,
+                    param_values[param_index],
+                    factories,
+                    frame_draw_options,
+                    image_options,
+                    device,
+                    compile_terms,
+                    static_layers,
+                )
+            )
+    return images
+
 
+def _render_frame(
+    param_index: int,
+    param: torch.Tensor,
+    factories: List[Factory],
+    draw_options: List[DrawOptions],
+    image_options: ImageOptions,
+    device: torch.device,
+    compile_terms: bool,
+    static_layers: List[Optional[torch.Tensor]],
+) -> Canvas:
+    image = _frame_canvas(image_options, 0)
+
+    # The curves between two static layers are drawn together so that
+    # consecutive implicit function graphs are still fused
+    curves_per_name = {}
+    draw_options_per_name = {}
+
+    for func_index, (factory, draw_option, static_layer) in enumerate(
+        zip(factories, draw_options, static_layers)
+    ):
+        if static_layer is None:
+            curves_per_name[f"{param_index}_{func_index}"] = factory(param)
+            draw_options_per_name[f"{param_index}_{func_index}"] = draw_option
+            continue
+
+        draw_curves(
+            image,
+            curves_per_name,
+            draw_options_per_name,
+            default_draw_options=DrawOptions(1, (0, 0, 0)),
+            device=device,
+            compile_terms=compile_terms,
+        )
         curves_per_name = {}
         draw_options_per_name = {}
+        _composite_static_layer(image, static_layer, draw_option.draw_color)
+
+    draw_curves(
+        image,
+        curves_per_name,
+        draw_options_per_name,
+        default_draw_options=DrawOptions(1, (0, 0, 0)),
+        device=device,
+        compile_terms=compile_terms,
+    )
+    return image
+
+
+def _render_batch(
+    param_indices: range,
+    params: torch.Tensor,
+    factories: List[Factory],
+    draw_options_per_frame: List[List[DrawOptions]],
+    image_options: ImageOptions,
+    device: torch.device,
+    compile_terms: bool,
+    static_layers: List[Optional[torch.Tensor]],
+) -> List[Canvas]:
+    images = []
+    for slot, param_index in enumerate(param_indices):
+        image = _frame_canvas(image_options, slot)
+        image.name = str(param_index)
+        images.append(image)
+
+    # Factories are drawn one after the other on every frame so that each
+    # canvas keeps the same draw order as in the sequential mode. Consecutive
+    # batched graphs are fused like in draw_curves, their terms sharing a plan.
+    batched_drawers = []
+    batched_colors = []
+    for func_index, factory in enumerate(factories):
+        draw_options = [
+            frame_draw_options[func_index]
+            for frame_draw_options in draw_options_per_frame
+        ]
 
-        for func_index, (factory, draw_option) in enumerate(
-            zip(factories, draw_options)
+        # The adaptive method subdivides each frame differently, it can't be batched
+        if (
+            static_layers[func_index] is None
+            and isinstance(factory, ImplicitFunctionGraphFactory)
+            and draw_options[0].method != "adaptive"
         ):
-            curves_per_name[f"{param_index}_{func_index}"] = factory(param)
+            curve = factory(params.view(-1, 1, 1).to(device))
+            if compile_terms:
+                curve = compile_curve(curve)
+            batched_drawers.append(
+                Drawer(
+                    curve,
+                    draw_options[0],
+                    images[0],
+                    f"{param_indices.start}_{func_index}",
+                )
+            )
+            batched_colors.append(
+                [draw_option.draw_color for draw_option in draw_options]
+            )
+            continue
 
-            if color_gradients is not None:
-                draw_option.draw_color = color_gradients[func_index][param_index]
+        _draw_batched(batched_drawers, batched_colors, images, device)
+        batched_drawers = []
+        batched_colors = []
 
-            draw_options_per_name[f"{param_index}_{func_index}"] = draw_option
+        if static_layers[func_index] is not None:
+            for image, draw_option in zip(images, draw_options):
+                _composite_static_layer(
+                    image, static_layers[func_index], draw_option.draw_color
+                )
+            continue
 
-        img = cv2.cvtColor(
-            main(
-                curves_per_name,
-                image_options,
-                draw_options_per_name,
-                default_draw_options=DrawOptions(1, (0, 0, 0)),
-                device=device,
-            ).image.numpy(),
-            cv2.COLOR_RGB2BGR,
-        )
-        if img is None:
-            print(f"Warning : image could not be read.")
+        for param_index, param, image, draw_option in zip(
+            param_indices, params, images, draw_options
+        ):
+            curve = factory(param)
+            if compile_terms:
+                curve = compile_curve(curve)
+            with frame(str(param_index)), span("draw"):
+                Drawer(curve, draw_option, image, f"{param_index}_{func_index}").draw(
+                    device
+                )
+
+    _draw_batched(batched_drawers, batched_colors, images, device)
+    return images
+
+
+def _draw_batched(
+    drawers: List[Drawer],
+    colors: List[List[Tuple[int, int, int]]],
+    images: List[Canvas],
+    device: torch.device,
+) -> None:
+    # colors[i][j] is the color of drawers[i] on images[j]
+    for fusion_key, group in groupby(
+        zip(drawers, colors), key=lambda item: item[0].fusion_key()
+    ):
+        group = list(group)
+        if fusion_key is not None and len(group) > 1:
+            with span("draw_fused"):
+                draw_fused(
+                    [drawer for drawer, _ in group],
+                    device,
+                    images,
+                    [drawer_colors for _, drawer_colors in group],
+                )
             continue
-        if img.size != resolution:
-            img = cv2.resize(img, resolution)
-        out.write(img)
-        print(f"Add image n°{image_options.name} to the animation\n")
 
-    out.release()
+        for drawer, drawer_colors in group:
+            with span("draw_batch"):
+                drawer.draw_batch(images, drawer_colors, device)
@@ -0,0 +1,143 @@
+from typing import Tuple, Union
+import torch
+
+# Cell edges are numbered bottom (0), right (1), top (2), left (3)
+_SADDLE_PAIRS = {
+    True: ((0, 1), (2, 3)),  # the center joins the bottom-left and top-right corners
+    False: ((3, 0), (1, 2)),  # the center joins the bottom-right and top-left corners
+}
+
+
+def contour_segments(
+    values: torch.Tensor, x_grid: torch.Tensor, y_grid: torch.Tensor
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Extract the zero level set of a sampled term with marching squares.
+
+    Args:
+        values: The term sampled on the grid, values[i, j] at (x_grid[i, j], y_grid[i, j])
+        x_grid, y_grid: Grids built with torch.meshgrid(t_x, t_y, indexing="ij")
+
+    Returns:
+        The (x0, y0, x1, y1) end points of the contour segments
+    """
+    positive = values > 0
+    p00, p10 = positive[:-1, :-1], positive[1:, :-1]
+    p01, p11 = positive[:-1, 1:], positive[1:, 1:]
+
+    # Only the cells whose corners disagree in sign are crossed by the contour
+    i, j = ((p00 != p10) | (p00 != p01) | (p00 != p11)).nonzero(as_tuple=True)
+    x0, y0, x1, y1, _ = _cell_segments(values, x_grid, y_grid, i, j, 0.0)
+    return x0, y0, x1, y1
+
+
+def contour_level_segments(
+    values: torch.Tensor,
+    x_grid: torch.Tensor,
+    y_grid: torch.Tensor,
+    levels: torch.Tensor,
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Extract the level sets values = c of several levels at once, each giving
+    the same segments as contour_segments(values - c, x_grid, y_grid).
+
+    Args:
+        values, x_grid, y_grid: As for contour_segments
+        levels: The levels c, in increasing order
+
+    Returns:
+        The (x0, y0, x1, y1) end points of the contour segments and the index
+        of the level of each segment
+    """
+    # A corner is above c when values > c, nan corners never are
+    corners = values.nan_to_num(nan=-torch.inf, posinf=torch.inf, neginf=-torch.inf)
+    cell_min = torch.minimum(
+        torch.minimum(corners[:-1, :-1], corners[1:, :-1]),
+        torch.minimum(corners[:-1, 1:], corners[1:, 1:]),
+    )
+    cell_max = torch.maximum(
+        torch.maximum(corners[:-1, :-1], corners[1:, :-1]),
+        torch.maximum(corners[:-1, 1:], corners[1:, 1:]),
+    )
+    # The corners of a cell disagree for the levels cell_min <= c < cell_max,
+    # levels[first:last] for each cell
+    first = torch.bucketize(cell_min, levels)
+    last = torch.bucketize(cell_max, levels)
+
+    i, j = (last > first).nonzero(as_tuple=True)
+    counts = (last - first)[i, j]
+    level_index = torch.repeat_interleave(first[i, j], counts)
+    level_index += torch.arange(
+        len(level_index), device=values.device
+    ) - torch.repeat_interleave(torch.cumsum(counts, 0) - counts, counts)
+    i, j = torch.repeat_interleave(i, counts), torch.repeat_interleave(j, counts)
+
+    x0, y0, x1, y1, cells = _cell_segments(
+        values, x_grid, y_grid, i, j, levels[level_index]
+    )
+    return x0, y0, x1, y1, level_index[cells]
+
+
+def _cell_segments(
+    values: torch.Tensor,
+    x_grid: torch.Tensor,
+    y_grid: torch.Tensor,
+    i: torch.Tensor,
+    j: torch.Tensor,
+    level: Union[float, torch.Tensor],
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+    # Segments of the level set values = level in the cells (i, j) and the
+    # index in i and j of the cell of each segment
+    v00, v10 = values[i, j] - level, values[i + 1, j] - level
+    v01, v11 = values[i, j + 1] - level, values[i + 1, j + 1] - level
+    p00, p10 = v00 > 0, v10 > 0
+    p01, p11 = v01 > 0, v11 > 0
+    x_a, x_b = x_grid[i, j], x_grid[i + 1, j]
+    y_a, y_b = y_grid[i, j], y_grid[i, j + 1]
+
+    crossed = torch.stack(
+        (
+            p00 != p10,
+            p10 != p11,
+            p01 != p11,
+            p00 != p01,
+        ),
+        dim=1,
+    )
+
+    # Linear interpolation of the zero on each edge, the ratios are only
+    # meaningful on crossed edges where the two values differ in sign
+    points = torch.stack(
+        (
+            torch.stack((x_a + v00 / (v00 - v10) * (x_b - x_a), y_a), dim=1),
+            torch.stack((x_b, y_a + v10 / (v10 - v11) * (y_b - y_a)), dim=1),
+            torch.stack((x_a + v01 / (v01 - v11) * (x_b - x_a), y_b), dim=1),
+            torch.stack((x_a, y_a + v00 / (v00 - v01) * (y_b - y_a)), dim=1),
+        ),
+        dim=1,
+    )
+
+    cells = torch.arange(len(i), device=values.device)
+    saddle = crossed.all(dim=1)
+
+    # Two crossed edges: join them
+    edges = torch.argsort((~crossed).to(torch.uint8), dim=1, stable=True)
+    starts = [points[cells[~saddle], edges[~saddle, 0]]]
+    ends = [points[cells[~saddle], edges[~saddle, 1]]]
+    segment_cells = [cells[~saddle]]
+
+    # Four crossed edges: the sign of the cell center decides the pairing
+    center = (v00 + v10 + v01 + v11) / 4
+    joined = (center > 0) == p00
+    for is_joined, pairs in _SADDLE_PAIRS.items():
+        saddle_cells = cells[saddle & (joined == is_joined)]
+        for start_edge, end_edge in pairs:
+            starts.append(points[saddle_cells, start_edge])
+            ends.append(points[saddle_cells, end_edge])
+            segment_cells.append(saddle_cells)
+
+    starts, ends = torch.cat(starts), torch.cat(ends)
+    segment_cells = torch.cat(segment_cells)
+    finite = torch.isfinite(starts).all(dim=1) & torch.isfinite(ends).all(dim=1)
+    starts, ends = starts[finite], ends[finite]
+    return starts[:, 0], starts[:, 1], ends[:, 0], ends[:, 1], segment_cells[finite]
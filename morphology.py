@@ -0,0 +1,59 @@
+from typing import Tuple
+import torch
+import torch.nn.functional as F
+
+
+def disc_offsets(diameter: int) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Offsets (dx, dy) of the pixels covered by a disc of the given diameter.
+
+    Odd diameters are centered on the pixel, even ones on the corner shared
+    with its bottom right neighbour.
+    """
+    center = (diameter - 1) / 2 - (diameter - 1) // 2
+    offsets = torch.arange(diameter) - (diameter - 1) // 2
+    dx, dy = torch.meshgrid(offsets, offsets, indexing="xy")
+    inside = (dx - center) ** 2 + (dy - center) ** 2 <= (diameter / 2) ** 2
+    return dx[inside], dy[inside]
+
+
+def disc_dilate(image: torch.Tensor, diameter: int) -> torch.Tensor:
+    """
+    Grey-level dilation of the last two dimensions of image by a disc.
+
+    The disc is split in one horizontal run per row, so the dilation costs one
+    separable max-pooling per distinct run length and one maximum per row
+    instead of one pass per pixel of the disc.
+    """
+    if diameter <= 1:
+        return image
+
+    dx, dy = disc_offsets(diameter)
+    height, width = image.shape[-2:]
+    padded = F.pad(
+        image.float().reshape(-1, 1, height, width),
+        (diameter, diameter, diameter, diameter),
+    )
+
+    dilated = torch.zeros_like(padded[..., :height, :width])
+    pooled_per_length = {}
+    for row in dy.unique().tolist():
+        run = dx[dy == row]
+        low, high = run.min().item(), run.max().item()
+        length = high - low + 1
+        if length not in pooled_per_length:
+            pooled_per_length[length] = F.max_pool2d(
+                padded, kernel_size=(1, length), stride=1
+            )
+        # dilated[y, x] = max(image[y - row, x - high : x - low + 1])
+        pooled = pooled_per_length[length]
+        dilated = torch.maximum(
+            dilated,
+            pooled[
+                ...,
+                diameter - row : diameter - row + height,
+                diameter - high : diameter - high + width,
+            ],
+        )
+
+    return dilated.reshape(image.shape).to(image.dtype)
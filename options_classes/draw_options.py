@@ -1,8 +1,80 @@
 from dataclasses import dataclass
-from typing import Tuple
+from typing import List, Optional, Tuple
+import torch
 
 
 @dataclass
 class DrawOptions:
     line_width: int = 1
     draw_color: Tuple[int] = (0, 0, 0)  ## RGB
+    method: str = "sample"  # must be in ["sample", "contour", "adaptive", "heatmap"]
+    # pixels between two samples of the "contour" method and of the "adaptive"
+    # method for parametric curves, initial block size of the "adaptive" method
+    # for implicit function graphs, which must then be above 1
+    grid_step: int = 1
+    # samples per pixel along each axis, above 1 the curve is anti-aliased by
+    # blending draw_color according to the fraction of covered samples
+    supersampling: int = 1
+    # dtype the curve is evaluated in, None to use the one of the ImageOptions
+    dtype: Optional[torch.dtype] = None
+    # (N, 3) RGB lookup table the "heatmap" method maps the values of the term
+    # through, e.g. from GradientGenerator.create_gradient_lut
+    colormap: Optional[torch.Tensor] = None
+    # term values mapped to the first and last colors of the colormap, by
+    # default the range of the finite values over the window of each frame
+    value_range: Optional[Tuple[float, float]] = None
+    # values c of the term of an implicit function graph whose equations
+    # term - c = 0 (or < 0, > 0 with its sign) are drawn in one pass by the
+    # "sample" and "contour" methods, sorted in increasing order. A pixel gets
+    # the color of the highest level covering it, as when drawing the levels
+    # one after the other in that order.
+    levels: Optional[List[float]] = None
+    # color of each level, draw_color for all of them by default
+    level_colors: Optional[List[Tuple[int]]] = None
+
+    def __post_init__(self) -> None:
+        if self.method not in ["sample", "contour", "adaptive", "heatmap"]:
+            raise ValueError("Invalid draw method")
+        if self.grid_step < 1:
+            raise ValueError("Grid step must be at least 1")
+        if self.supersampling < 1:
+            raise ValueError("Supersampling must be at least 1")
+        if self.supersampling > 1 and self.method != "sample":
+            raise ValueError("Supersampling is only supported by the sample method")
+        if self.dtype not in [
+            None,
+            torch.float16,
+            torch.bfloat16,
+            torch.float32,
+            torch.float64,
+        ]:
+            raise ValueError("Invalid evaluation dtype")
+        if self.colormap is not None:
+            self.colormap = torch.as_tensor(self.colormap, dtype=torch.uint8)
+            if self.colormap.ndim != 2 or self.colormap.shape[1] != 3:
+                raise ValueError("The colormap must be a list of RGB colors")
+            if len(self.colormap) == 0:
+                raise ValueError("The colormap must contain at least one color")
+        if self.method == "heatmap" and self.colormap is None:
+            raise ValueError("The heatmap method needs a colormap")
+        if self.value_range is not None and self.value_range[0] >= self.value_range[1]:
+            raise ValueError("The value range must be increasing")
+        if self.levels is not None:
+            if len(self.levels) == 0:
+                raise ValueError("Levels must contain at least one level")
+            if self.method not in ["sample", "contour"] or self.supersampling > 1:
+                raise ValueError(
+                    "Levels are only supported by the sample and contour methods without supersampling"
+                )
+            if self.level_colors is not None:
+                if len(self.level_colors) != len(self.levels):
+                    raise ValueError("Every level needs a color")
+                self.level_colors = [
+                    self.level_colors[index]
+                    for index in sorted(
+                        range(len(self.levels)), key=self.levels.__getitem__
+                    )
+                ]
+            self.levels = sorted(self.levels)
+        elif self.level_colors is not None:
+            raise ValueError("Level colors need levels")
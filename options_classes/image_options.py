@@ -1,5 +1,6 @@
 from dataclasses import dataclass
-from typing import Tuple, List
+from typing import Optional, Tuple, List
+import torch
 
 
 @dataclass
@@ -14,3 +15,19 @@ class ImageOptions:
     grid_width: int = 1
     tick_length: int = 15
     name: str = "image"
+    # Bytes the drawers may use for their intermediates, None for no limit
+    memory_budget: Optional[int] = None
+    # File holding the pixels of the canvas, None to keep them in memory
+    backing_file: Optional[str] = None
+    # dtype of the grids, samples and terms of the curves, unless their
+    # DrawOptions override it
+    dtype: torch.dtype = torch.float32
+
+    def __post_init__(self) -> None:
+        if self.dtype not in [
+            torch.float16,
+            torch.bfloat16,
+            torch.float32,
+            torch.float64,
+        ]:
+            raise ValueError("Invalid evaluation dtype")
@@ -0,0 +1,106 @@
+from typing import Callable, List, Tuple
+import torch
+
+_MAX_REFINEMENTS = 4
+
+
+def adaptive_curve_samples(
+    x_func: Callable[[torch.Tensor], torch.Tensor],
+    y_func: Callable[[torch.Tensor], torch.Tensor],
+    t: torch.Tensor,
+    to_pixels: Callable[
+        [torch.Tensor, torch.Tensor], Tuple[torch.Tensor, torch.Tensor]
+    ],
+    size: List[int],
+    step: float,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Sample a parametric curve densely where it moves fast in pixel space.
+
+    Starting from the parameter values t, every visible interval whose end
+    points are more than step pixels apart is split according to its length,
+    and only the new parameter values are evaluated. Intervals that stay
+    outside of the image are never refined.
+
+    Returns:
+        The (pixel_x, pixel_y) coordinates of the samples, in parameter order
+    """
+    pixel_x, pixel_y = to_pixels(x_func(t), y_func(t))
+    interval_subdivisions = max_subdivisions(size, step)
+
+    for _ in range(_MAX_REFINEMENTS):
+        subdivisions = (
+            (segment_lengths(pixel_x, pixel_y) / step)
+            .ceil()
+            .nan_to_num(1, posinf=1)
+            .clamp(1, interval_subdivisions)
+            .long()
+        )
+        subdivisions[~visible_segments(pixel_x, pixel_y, size)] = 1
+        if (subdivisions == 1).all():
+            break
+
+        t, new = _subdivide(t, subdivisions)
+        new_x, new_y = to_pixels(x_func(t[new]), y_func(t[new]))
+        pixel_x = _merge(pixel_x, new_x, new)
+        pixel_y = _merge(pixel_y, new_y, new)
+
+    return pixel_x, pixel_y
+
+
+def max_subdivisions(size: List[int], step: float) -> int:
+    # Parts an interval may be split in by one refinement pass
+    return int(2 * max(size) / step) + 1
+
+
+def segment_lengths(pixel_x: torch.Tensor, pixel_y: torch.Tensor) -> torch.Tensor:
+    # Pixels crossed along the major axis between two consecutive samples
+    return torch.maximum(pixel_x.diff().abs(), pixel_y.diff().abs())
+
+
+def visible_segments(
+    pixel_x: torch.Tensor, pixel_y: torch.Tensor, size: List[int]
+) -> torch.Tensor:
+    # Segments with finite ends whose bounding box meets the image
+    x_0, x_1, y_0, y_1 = pixel_x[:-1], pixel_x[1:], pixel_y[:-1], pixel_y[1:]
+    return (
+        torch.isfinite(x_0)
+        & torch.isfinite(x_1)
+        & torch.isfinite(y_0)
+        & torch.isfinite(y_1)
+        & (torch.maximum(x_0, x_1) >= 0)
+        & (torch.minimum(x_0, x_1) < size[0])
+        & (torch.maximum(y_0, y_1) >= 0)
+        & (torch.minimum(y_0, y_1) < size[1])
+    )
+
+
+def _subdivide(
+    t: torch.Tensor, subdivisions: torch.Tensor
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    # Interval i is split in subdivisions[i] equal parts, the new parameter
+    # values are inserted after t[i]
+    interval = torch.repeat_interleave(
+        torch.arange(len(subdivisions), device=t.device), subdivisions
+    )
+    starts = torch.cumsum(subdivisions, 0) - subdivisions
+    part = torch.arange(len(interval), device=t.device) - starts[interval]
+
+    refined = torch.cat(
+        (
+            t[interval]
+            + (t[interval + 1] - t[interval]) * part / subdivisions[interval],
+            t[-1:],
+        )
+    )
+    new = torch.cat((part > 0, torch.zeros(1, dtype=torch.bool, device=t.device)))
+    return refined, new
+
+
+def _merge(
+    old: torch.Tensor, new_values: torch.Tensor, new: torch.Tensor
+) -> torch.Tensor:
+    merged = torch.empty(len(new), dtype=old.dtype, device=old.device)
+    merged[new] = new_values
+    merged[~new] = old
+    return merged
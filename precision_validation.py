@@ -0,0 +1,75 @@
+from dataclasses import dataclass, field, replace
+from typing import Dict, Union
+
+import torch
+
+from graphs_classes import ParametricCurve, ImplicitFunctionGraph
+from main import main
+from options_classes import DrawOptions, ImageOptions
+
+
+@dataclass
+class PrecisionReport:
+    differing_pixels: int  # pixels whose color differs from the float64 render
+    total_pixels: int
+    per_curve: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def differing_fraction(self) -> float:
+        return self.differing_pixels / self.total_pixels
+
+
+def validate_precision(
+    curves: Dict[str, Union[ParametricCurve, ImplicitFunctionGraph]],
+    image_options: ImageOptions,
+    draw_options: Dict[str, DrawOptions],
+    default_draw_options: DrawOptions = DrawOptions(1, (0, 0, 0)),
+    device: torch.device = torch.device("cpu"),
+    per_curve: bool = False,
+) -> PrecisionReport:
+    """
+    Render the curves with their configured dtypes and again in float64, and
+    count the pixels that differ.
+
+    With per_curve, every curve is also rendered alone both ways to find the
+    ones that lose precision.
+    """
+    # Both renders stay in memory
+    image_options = replace(image_options, backing_file=None)
+    reference_image_options = replace(image_options, dtype=torch.float64)
+
+    def render(
+        curves: Dict[str, Union[ParametricCurve, ImplicitFunctionGraph]],
+        reference: bool,
+    ) -> torch.Tensor:
+        options = draw_options
+        default_options = default_draw_options
+        if reference:
+            options = {
+                name: replace(draw_option, dtype=None)
+                for name, draw_option in draw_options.items()
+            }
+            default_options = replace(default_draw_options, dtype=None)
+        return main(
+            curves,
+            reference_image_options if reference else image_options,
+            options,
+            default_options,
+            device,
+        ).image
+
+    def differing_pixels(
+        curves: Dict[str, Union[ParametricCurve, ImplicitFunctionGraph]],
+    ) -> int:
+        return int(
+            (render(curves, False) != render(curves, True)).any(dim=-1).sum().item()
+        )
+
+    report = PrecisionReport(
+        differing_pixels=differing_pixels(curves),
+        total_pixels=image_options.size[0] * image_options.size[1],
+    )
+    if per_curve:
+        for name, curve in curves.items():
+            report.per_curve[name] = differing_pixels({name: curve})
+    return report
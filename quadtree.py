@@ -0,0 +1,113 @@
+from typing import Tuple
+import torch
+
+from graphs_classes import ImplicitFunctionGraph
+
+
+def adaptive_mask(
+    curve: ImplicitFunctionGraph,
+    t_x: torch.Tensor,
+    t_y: torch.Tensor,
+    block_size: int,
+) -> torch.Tensor:
+    """
+    Evaluate the equation of an implicit function graph on the grid spanned by
+    t_x and t_y, subdividing only the blocks whose corners disagree.
+
+    The term is first evaluated at the corners of blocks of block_size samples.
+    A block whose corners are all in (or all out of) the graph is filled
+    directly, the other ones are split in four and evaluated again at the next
+    level. Each level is a single call of the term on the corners of all its
+    blocks, and blocks reduced to a single sample are exact.
+
+    Returns:
+        The (len(t_x), len(t_y)) mask that `curve.equation` would give on the
+        grid, up to features smaller than a block that no corner catches
+    """
+    size_x, size_y = len(t_x), len(t_y)
+    device = t_x.device
+
+    i_start, j_start = torch.meshgrid(
+        torch.arange(0, size_x, block_size, device=device),
+        torch.arange(0, size_y, block_size, device=device),
+        indexing="ij",
+    )
+    i_start, j_start = i_start.flatten(), j_start.flatten()
+    i_end = (i_start + block_size).clamp(max=size_x)
+    j_end = (j_start + block_size).clamp(max=size_y)
+
+    # Filled blocks are accumulated as 2D differences, two cumulative sums
+    # turn them into the mask without materializing the indices of their samples
+    filled = torch.zeros((size_x + 1, size_y + 1), dtype=torch.int32, device=device)
+
+    while len(i_start) > 0:
+        corner_i = torch.stack((i_start, i_end - 1, i_start, i_end - 1))
+        corner_j = torch.stack((j_start, j_start, j_end - 1, j_end - 1))
+        values = _evaluate_corners(curve, t_x, t_y, corner_i, corner_j)
+
+        satisfied = curve.satisfied(values)
+        refine = satisfied.any(dim=0) & ~satisfied.all(dim=0)
+        if curve.sign == "=":
+            # The curve may cross a block without touching any of its corners
+            positive = values > 0
+            refine |= positive.any(dim=0) & ~positive.all(dim=0) & ~satisfied.all(dim=0)
+        exact = (i_end - i_start == 1) & (j_end - j_start == 1)
+
+        fill = ~refine & satisfied.all(dim=0) | exact & satisfied[0]
+        _fill_blocks(filled, i_start[fill], i_end[fill], j_start[fill], j_end[fill])
+
+        refine &= ~exact
+        i_start, i_end, j_start, j_end = _split_blocks(
+            i_start[refine], i_end[refine], j_start[refine], j_end[refine]
+        )
+
+    return filled.cumsum(dim=0).cumsum(dim=1)[:size_x, :size_y] > 0
+
+
+def _evaluate_corners(
+    curve: ImplicitFunctionGraph,
+    t_x: torch.Tensor,
+    t_y: torch.Tensor,
+    corner_i: torch.Tensor,
+    corner_j: torch.Tensor,
+) -> torch.Tensor:
+    # Neighbouring blocks share corners, each sample is evaluated only once
+    samples, inverse = torch.unique(corner_i * len(t_y) + corner_j, return_inverse=True)
+    values = curve.term(t_x[samples // len(t_y)], t_y[samples % len(t_y)])
+    return values[inverse]
+
+
+def _fill_blocks(
+    filled: torch.Tensor,
+    i_start: torch.Tensor,
+    i_end: torch.Tensor,
+    j_start: torch.Tensor,
+    j_end: torch.Tensor,
+) -> None:
+    ones = torch.ones_like(i_start, dtype=filled.dtype)
+    filled.index_put_((i_start, j_start), ones, accumulate=True)
+    filled.index_put_((i_end, j_start), -ones, accumulate=True)
+    filled.index_put_((i_start, j_end), -ones, accumulate=True)
+    filled.index_put_((i_end, j_end), ones, accumulate=True)
+
+
+def _split_blocks(
+    i_start: torch.Tensor,
+    i_end: torch.Tensor,
+    j_start: torch.Tensor,
+    j_end: torch.Tensor,
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+    i_middle = i_start + (i_end - i_start + 1) // 2
+    j_middle = j_start + (j_end - j_start + 1) // 2
+
+    children = [
+        (i_start, i_middle, j_start, j_middle),
+        (i_middle, i_end, j_start, j_middle),
+        (i_start, i_middle, j_middle, j_end),
+        (i_middle, i_end, j_middle, j_end),
+    ]
+    i_start, i_end, j_start, j_end = (torch.cat(bounds) for bounds in zip(*children))
+
+    # Blocks one sample wide only have two children
+    non_empty = (i_end > i_start) & (j_end > j_start)
+    return i_start[non_empty], i_end[non_empty], j_start[non_empty], j_end[non_empty]
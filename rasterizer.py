@@ -0,0 +1,46 @@
+from typing import Tuple
+import torch
+
+
+def rasterize_segments(
+    x0: torch.Tensor, y0: torch.Tensor, x1: torch.Tensor, y1: torch.Tensor
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Rasterize line segments given in pixel coordinates.
+
+    Every segment is sampled at most one pixel apart along its major axis, so
+    consecutive samples always land on touching pixels and the line is gapless.
+
+    Returns:
+        The (pixel_x, pixel_y) coordinates of all the samples, not clamped
+    """
+    pixel_x, pixel_y, _ = _rasterize(x0, y0, x1, y1)
+    return pixel_x, pixel_y
+
+
+def rasterize_labeled_segments(
+    x0: torch.Tensor,
+    y0: torch.Tensor,
+    x1: torch.Tensor,
+    y1: torch.Tensor,
+    labels: torch.Tensor,
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    # rasterize_segments, also returning the label of the segment of each sample
+    pixel_x, pixel_y, segment = _rasterize(x0, y0, x1, y1)
+    return pixel_x, pixel_y, labels[segment]
+
+
+def _rasterize(
+    x0: torch.Tensor, y0: torch.Tensor, x1: torch.Tensor, y1: torch.Tensor
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    steps = torch.maximum((x1 - x0).abs(), (y1 - y0).abs()).ceil().long() + 1
+    segment = torch.repeat_interleave(
+        torch.arange(len(steps), device=steps.device), steps
+    )
+    first_sample = torch.cumsum(steps, 0) - steps
+    sample = torch.arange(len(segment), device=steps.device) - first_sample[segment]
+    fraction = sample / (steps[segment] - 1).clamp(min=1)
+
+    pixel_x = x0[segment] + fraction * (x1 - x0)[segment]
+    pixel_y = y0[segment] + fraction * (y1 - y0)[segment]
+    return pixel_x.floor().long(), pixel_y.floor().long(), segment
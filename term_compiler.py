@@ -0,0 +1,81 @@
+from dataclasses import replace
+from functools import partial
+from pathlib import Path
+from typing import Callable, Union
+import os
+
+import torch
+
+from graphs_classes import Expression, ImplicitFunctionGraph, ParametricCurve
+
+MAX_COMPILED_FUNCTIONS = 64
+
+
+def set_kernel_cache_dir(path: Union[str, Path]) -> None:
+    """
+    Persist the compiled kernels in path.
+
+    Inductor's FX graph cache keys the kernels by the traced graph, which
+    follows the source of the function, and by the shapes and dtypes of its
+    inputs, so later runs load them instead of compiling again. It must be
+    called before the first compilation.
+    """
+    os.environ["TORCHINDUCTOR_CACHE_DIR"] = str(path)
+    torch._inductor.config.fx_graph_cache = True
+
+
+@torch.compile(dynamic=False)
+def _call_compiled(
+    func: Callable[..., torch.Tensor], *args: torch.Tensor
+) -> torch.Tensor:
+    # Dynamo inlines func and guards on its code object, so the lambdas that
+    # factories create again for every frame reuse the same kernels
+    return func(*args)
+
+
+def _call_with_cache_size(
+    func: Callable[..., torch.Tensor], *args: torch.Tensor
+) -> torch.Tensor:
+    # Every distinct function takes one entry of the compiled code cache of
+    # _call_compiled, its limit is only raised while the curves are evaluated
+    with torch._dynamo.config.patch(
+        cache_size_limit=max(
+            torch._dynamo.config.cache_size_limit, MAX_COMPILED_FUNCTIONS
+        )
+    ):
+        return _call_compiled(func, *args)
+
+
+def compile_function(func: Callable[..., torch.Tensor]) -> Callable[..., torch.Tensor]:
+    return partial(_call_with_cache_size, func)
+
+
+def _compile_term(
+    term: Union[Callable[..., torch.Tensor], Expression],
+) -> Union[Callable[..., torch.Tensor], Expression]:
+    # Expressions stay expressions so their common sub-expressions are still
+    # shared with the terms they are evaluated with, in a single compiled plan
+    if isinstance(term, Expression):
+        return term.compiled(compile_function)
+    return compile_function(term)
+
+
+def compile_curve(
+    curve: Union[ParametricCurve, ImplicitFunctionGraph],
+) -> Union[ParametricCurve, ImplicitFunctionGraph]:
+    """
+    Copy of the curve whose functions are compiled into fused kernels.
+
+    The chains of elementwise operations of a term are evaluated in a single
+    pass instead of allocating one full-size intermediate per operation.
+    """
+    if isinstance(curve, ImplicitFunctionGraph):
+        return replace(curve, term=_compile_term(curve.term))
+    elif isinstance(curve, ParametricCurve):
+        return replace(
+            curve,
+            x_func=_compile_term(curve.x_func),
+            y_func=_compile_term(curve.y_func),
+        )
+    else:
+        raise ValueError("Unsupported curve type")
@@ -0,0 +1,97 @@
+import torch
+
+from graphs_classes import (
+    Expression,
+    ImplicitFunctionGraph,
+    ImplicitFunctionGraphFactory,
+    ParametricCurve,
+    ParametricCurveFactory,
+)
+import make_animation as animation
+from options_classes import DrawOptions, ImageOptions
+
+bounds = [[-4, 4], [-4, 4]]
+
+
+class CollectingSink:
+    def __init__(self):
+        self.frames = {}
+
+    def write(self, name, frame):
+        self.frames[name] = frame.copy()
+
+    def release(self):
+        pass
+
+
+def graph_factory(source, sign, tolerance):
+    return ImplicitFunctionGraphFactory(
+        lambda p: ImplicitFunctionGraph(
+            Expression(source, params={"p": p}), sign, tolerance, bounds
+        )
+    )
+
+
+FACTORIES = [
+    graph_factory("sin(x * p) + cos(y) - 0.3", "<", 0),
+    graph_factory("sin(x * p) * cos(y)", "=", 0.1),
+    ImplicitFunctionGraphFactory(
+        lambda p: ImplicitFunctionGraph(
+            lambda x, y: x**2 + y**2 - 4 * p, ">", 0, bounds
+        )
+    ),
+    ParametricCurveFactory(
+        lambda p: ParametricCurve(
+            [0, 6.3], bounds, lambda t: 3 * torch.cos(t * p), "3 * sin(t)", 2000
+        )
+    ),
+    graph_factory("x * y * p", "<", 0.5),
+    graph_factory("x - y * p", ">", 0),
+]
+DRAW_OPTIONS = [
+    DrawOptions(draw_color=(200, 0, 0)),
+    DrawOptions(draw_color=(0, 200, 0)),
+    DrawOptions(draw_color=(0, 0, 200)),
+    DrawOptions(draw_color=(9, 9, 9)),
+    DrawOptions(draw_color=(1, 100, 1)),
+    DrawOptions(draw_color=(50, 60, 70), line_width=2),
+]
+
+
+def render(**options):
+    sink = CollectingSink()
+    animation.make_animation(
+        [0.5, 3],
+        5,
+        FACTORIES,
+        DRAW_OPTIONS,
+        ImageOptions(size=(90, 80), draw_bounds=bounds),
+        None,
+        color_gradients=[
+            [(40 * step, color, 0) for step in range(5)] for color in range(6)
+        ],
+        sink=sink,
+        **options,
+    )
+    return sink.frames
+
+
+def test_batches_fuse_consecutive_graphs(monkeypatch):
+    fused = []
+    draw_fused = animation.draw_fused
+    monkeypatch.setattr(
+        animation,
+        "draw_fused",
+        lambda drawers, *arguments: (
+            fused.append(len(drawers)),
+            draw_fused(drawers, *arguments),
+        ),
+    )
+
+    sequential = render()
+    batched = render(batch_size=3)
+
+    assert fused == [3, 3]
+    assert sequential.keys() == batched.keys()
+    for name, frame in sequential.items():
+        assert (batched[name] == frame).all()
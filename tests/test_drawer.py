@@ -0,0 +1,95 @@
+import pytest
+import torch
+
+from graphs_classes import ImplicitFunctionGraph, ParametricCurve
+from main import main
+from options_classes import DrawOptions, ImageOptions
+
+bounds = [[-3, 3], [-3, 3]]
+
+
+def draw(curves, memory_budget=None, **options):
+    image = main(
+        curves,
+        ImageOptions(size=(120, 100), draw_bounds=bounds, memory_budget=memory_budget),
+        {name: DrawOptions(draw_color=(200, 0, 0), **options) for name in curves},
+    )
+    return image.image
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        dict(),
+        dict(line_width=3),
+        dict(supersampling=3),
+        dict(method="adaptive", grid_step=2),
+    ],
+)
+def test_parametric_budget_keeps_the_pixels(options):
+    curves = {
+        "lissajous": ParametricCurve(
+            [0, 60],
+            bounds,
+            lambda t: 2.5 * torch.sin(1.3 * t) * torch.cos(t / 7),
+            lambda t: 2.5 * torch.cos(2.1 * t),
+            20001,
+        ),
+        # Samples landing on pixel boundaries, where the last bit matters
+        "diagonal": ParametricCurve(
+            [-3, 3], bounds, lambda t: t, lambda t: 0.7 * t, 20001
+        ),
+        "point": ParametricCurve([-2.9, 2.3], bounds, lambda t: t, lambda t: t, 1),
+    }
+
+    unbudgeted = draw(curves, **options)
+    for memory_budget in (20_000, 200_000):
+        assert torch.equal(draw(curves, memory_budget, **options), unbudgeted)
+
+
+@pytest.mark.parametrize("sign", ["<", "=", ">"])
+@pytest.mark.parametrize("grid_step, line_width", [(4, 1), (5, 3), (16, 2)])
+def test_adaptive_implicit_budget_keeps_the_pixels(sign, grid_step, line_width):
+    curves = {
+        "waves": ImplicitFunctionGraph(
+            lambda x, y: torch.sin(3 * x) * torch.cos(2 * y) - 0.2 * x,
+            sign,
+            0.05,
+            bounds,
+        )
+    }
+    options = dict(method="adaptive", grid_step=grid_step, line_width=line_width)
+
+    unbudgeted = draw(curves, **options)
+    for memory_budget in (10_000, 100_000):
+        assert torch.equal(draw(curves, memory_budget, **options), unbudgeted)
+
+
+def counting_term(evaluations):
+    def term(x, y):
+        evaluations.append(torch.broadcast_shapes(x.shape, y.shape).numel())
+        return torch.sin(3 * x) * torch.cos(2 * y) - 0.2 * x
+
+    return term
+
+
+def test_adaptive_evaluates_fewer_samples_than_sample():
+    evaluations = {"sample": [], "adaptive": []}
+    images = {}
+    for method, grid_step in (("sample", 1), ("adaptive", 8)):
+        curves = {
+            "waves": ImplicitFunctionGraph(
+                counting_term(evaluations[method]), "<", 0, bounds
+            )
+        }
+        images[method] = draw(curves, method=method, grid_step=grid_step)
+
+    assert sum(evaluations["adaptive"]) < sum(evaluations["sample"]) / 2
+    assert torch.equal(images["adaptive"], images["sample"])
+
+
+def test_adaptive_rejects_single_sample_blocks():
+    curves = {"waves": ImplicitFunctionGraph(counting_term([]), "<", 0, bounds)}
+
+    with pytest.raises(ValueError, match="grid step above 1"):
+        draw(curves, method="adaptive")
@@ -0,0 +1,83 @@
+import pytest
+import torch
+
+from graphs_classes import ImplicitFunctionGraph, ParametricCurve
+from graphs_classes.expression import Expression, evaluate_expressions
+from term_compiler import compile_curve
+
+x = torch.linspace(-2, 2, 9)
+y = torch.linspace(3, -1, 9)
+
+
+@pytest.mark.parametrize(
+    "source, expected",
+    [
+        ("max(x, 0)", lambda: torch.clamp(x, min=0)),
+        ("max(0, x)", lambda: torch.clamp(x, min=0)),
+        ("min(y, 1)", lambda: torch.clamp(y, max=1)),
+        ("hypot(x, 1)", lambda: torch.sqrt(x**2 + 1)),
+        ("arctan2(y, 1)", lambda: torch.arctan(y)),
+        ("arctan2(1, x)", lambda: torch.arctan2(torch.ones_like(x), x)),
+        ("max(1, 2) * x", lambda: 2 * x),
+        ("cos(pi) + y", lambda: y - 1),
+    ],
+)
+def test_scalar_and_tensor_arguments(source, expected):
+    torch.testing.assert_close(Expression(source)(x, y), expected())
+
+
+def test_scalar_arguments_follow_the_tensor_dtype():
+    values = Expression("max(x, 0.1) + hypot(1, y)")(x.double(), y.double())
+
+    assert values.dtype == torch.float64
+    torch.testing.assert_close(
+        values, torch.clamp(x.double(), min=0.1) + torch.sqrt(1 + y.double() ** 2)
+    )
+
+
+def test_scalar_only_call():
+    assert Expression("max(1, 2)")(x, y).item() == 2
+
+
+def test_compiled_expressions_run_one_shared_plan():
+    runs = []
+
+    def compile_function(run):
+        def compiled(*arguments):
+            runs.append(len(run.__self__.steps))
+            return run(*arguments)
+
+        return compiled
+
+    first = Expression("sin(x) * y").compiled(compile_function)
+    second = Expression("sin(x) + 1")
+    values = evaluate_expressions([first, second], x, y)
+
+    # x, y, sin(x), *, 1 and + in a single plan
+    assert runs == [6]
+    torch.testing.assert_close(values[0], torch.sin(x) * y)
+    torch.testing.assert_close(values[1], torch.sin(x) + 1)
+
+
+def test_compiled_curves_keep_their_expressions():
+    bounds = [[-1, 1], [-1, 1]]
+    graph = compile_curve(ImplicitFunctionGraph("x - y", "<", 0, bounds))
+    curve = compile_curve(ParametricCurve([0, 1], bounds, "cos(t)", "sin(t)", 10))
+
+    assert isinstance(graph.term, Expression)
+    assert graph.term.compile_function is not None
+    assert isinstance(curve.x_func, Expression)
+    assert isinstance(curve.y_func, Expression)
+
+
+@pytest.mark.parametrize(
+    "source", ["max(x)", "min(x, y, 1)", "sin(x, y)", "hypot()", "cos(max(x))"]
+)
+def test_wrong_argument_count_fails_at_construction(source):
+    with pytest.raises(ValueError, match="Wrong number of arguments"):
+        Expression(source)
+
+
+def test_wrong_argument_count_in_definition():
+    with pytest.raises(ValueError, match="Wrong number of arguments"):
+        Expression("r - 1", definitions={"r": "hypot(x)"})
@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from frame_cache import FrameCache
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SCRIPT = """
+import torch
+from frame_cache import fingerprint
+
+NAMES = {"sin", "cos", "tan"}
+SCALES = {0.5, 2, "half", (1, 2)}
+
+def helper(x):
+    return torch.sin(x) if "sin" in NAMES else x
+
+def term(x, y):
+    return helper(x) * min(SCALES - {"half", (1, 2)}) + y in {1, 2, 3}
+
+print(fingerprint(term, frozenset({"a", "b", "c"})))
+"""
+
+
+def fingerprint_with_seed(seed):
+    environment = dict(os.environ, PYTHONHASHSEED=str(seed), PYTHONPATH=str(ROOT))
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT],
+        env=environment,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.strip()
+
+
+def test_fingerprint_does_not_depend_on_the_hash_seed():
+    fingerprints = {fingerprint_with_seed(seed) for seed in (0, 1, 2, 3)}
+
+    assert len(fingerprints) == 1
+
+
+def test_stored_frames_count_as_misses(tmp_path):
+    frame_cache = FrameCache(tmp_path)
+    frame = np.zeros((2, 2, 3), dtype=np.uint8)
+
+    assert "a" not in frame_cache
+    frame_cache.put("a", frame)
+    frame_cache.put("a", frame)
+    assert frame_cache.get("a") is not None
+    assert frame_cache.get("b") is None
+
+    assert (frame_cache.hits, frame_cache.misses) == (1, 2)
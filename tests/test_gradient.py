@@ -0,0 +1,47 @@
+import pytest
+import torch
+
+from color_gradient import GradientGenerator
+from color_gradient.easing import Easing
+
+COLORS = [
+    [(32, 122, 220), (70, 220, 90), (220, 70, 50), (130, 40, 215)],
+    [(49, 175, 255), (134, 255, 145)],
+]
+
+
+@pytest.mark.parametrize("colors", COLORS)
+@pytest.mark.parametrize("colorspace", ["RGB", "HSL", "HSV"])
+@pytest.mark.parametrize("easing", [Easing.linear, Easing.ease_in_cubic])
+@pytest.mark.parametrize("steps", [2, 17, 256, 1000])
+def test_lut_matches_gradient(colors, colorspace, easing, steps):
+    generator = GradientGenerator()
+    gradient = generator.create_gradient(colors, steps, colorspace, easing)
+    lut = generator.create_gradient_lut(colors, steps, colorspace, easing)
+
+    assert lut.dtype == torch.uint8
+    assert torch.equal(lut, torch.tensor(gradient, dtype=torch.uint8))
+
+
+# torch.cos and torch.pow round differently than math.cos and pow, a few
+# components may be one level apart
+@pytest.mark.parametrize("colors", COLORS)
+@pytest.mark.parametrize("colorspace", ["RGB", "HSL", "HSV"])
+@pytest.mark.parametrize(
+    "easing, gamma",
+    [
+        (Easing.ease_in_out_sine, 1.0),
+        (Easing.ease_in_out_cubic, 1.0),
+        (Easing.linear, 2.2),
+        (Easing.ease_in_out_sine, 2.2),
+    ],
+)
+@pytest.mark.parametrize("steps", [2, 17, 256, 1000])
+def test_lut_within_one_level_of_gradient(colors, colorspace, easing, gamma, steps):
+    generator = GradientGenerator()
+    gradient = generator.create_gradient(colors, steps, colorspace, easing, gamma)
+    lut = generator.create_gradient_lut(colors, steps, colorspace, easing, gamma)
+
+    assert lut.dtype == torch.uint8
+    difference = lut.int() - torch.tensor(gradient, dtype=torch.int32)
+    assert difference.abs().max() <= 1
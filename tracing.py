@@ -0,0 +1,179 @@
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional
+import csv
+import json
+import os
+import threading
+import time
+
+
+class SpanEvent(NamedTuple):
+    name: str
+    frame: Optional[str]
+    start: int  # ns, perf_counter_ns
+    duration: int  # ns
+    pid: int
+    tid: int
+
+
+class Tracer:
+    """
+    Collect the spans recorded while tracing is enabled.
+
+    Spans are attributed to the frame set by the innermost `frame` block of
+    their thread, or to the frame they are given explicitly.
+    """
+
+    def __init__(self) -> None:
+        self.events: List[SpanEvent] = []
+        self._lock = threading.Lock()
+
+    def record(self, event: SpanEvent) -> None:
+        with self._lock:
+            self.events.append(event)
+
+    def drain(self) -> List[SpanEvent]:
+        # Hand the events over, e.g. from a worker process to the main one
+        with self._lock:
+            events, self.events = self.events, []
+        return events
+
+    def export_chrome_trace(self, path: str) -> None:
+        # Complete events, in microseconds, viewable in chrome://tracing or Perfetto
+        trace_events = [
+            {
+                "name": event.name,
+                "cat": "render",
+                "ph": "X",
+                "ts": event.start / 1e3,
+                "dur": event.duration / 1e3,
+                "pid": event.pid,
+                "tid": event.tid,
+                "args": {"frame": event.frame},
+            }
+            for event in self.events
+        ]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": trace_events}, file)
+
+    def export_csv(self, path: str) -> None:
+        # One row per frame and stage, with the time summed over its spans
+        totals: Dict[tuple, List[int]] = defaultdict(lambda: [0, 0])
+        for event in self.events:
+            total = totals[(event.frame or "", event.name)]
+            total[0] += 1
+            total[1] += event.duration
+
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["frame", "stage", "calls", "total_ms", "mean_ms"])
+            for (frame, stage), (calls, duration) in sorted(
+                totals.items(), key=lambda item: (_frame_order(item[0][0]), item[0])
+            ):
+                writer.writerow(
+                    [
+                        frame,
+                        stage,
+                        calls,
+                        f"{duration / 1e6:.4f}",
+                        f"{duration / calls / 1e6:.4f}",
+                    ]
+                )
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "frame", "start")
+
+    def __init__(self, tracer: Tracer, name: str, frame: Optional[str]) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.frame = frame
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        end = time.perf_counter_ns()
+        self.tracer.record(
+            SpanEvent(
+                self.name,
+                self.frame,
+                self.start,
+                end - self.start,
+                os.getpid(),
+                threading.get_ident(),
+            )
+        )
+
+
+class _FrameBlock:
+    __slots__ = ("name", "previous")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> "_FrameBlock":
+        self.previous = getattr(_current, "frame", None)
+        _current.frame = self.name
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        _current.frame = self.previous
+
+
+class _NullBlock:
+    # Shared by every span and frame block while tracing is disabled
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullBlock":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NULL_BLOCK = _NullBlock()
+_tracer: Optional[Tracer] = None
+_current = threading.local()
+
+
+def enable_tracing() -> Tracer:
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def disable_tracing() -> Optional[Tracer]:
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+def span(name: str, frame: str = None):
+    """
+    Time the block as a stage of the current frame, does nothing unless
+    tracing is enabled.
+    """
+    if _tracer is None:
+        return _NULL_BLOCK
+    if frame is None:
+        frame = getattr(_current, "frame", None)
+    return _Span(_tracer, name, frame)
+
+
+def frame(name: str):
+    # Attribute the spans of the block, in this thread, to the frame name
+    if _tracer is None:
+        return _NULL_BLOCK
+    return _FrameBlock(name)
+
+
+def _frame_order(frame: str) -> tuple:
+    # Numbered frames first, in numerical order
+    first = frame.split("-")[0]
+    return (0, int(first), frame) if first.isdigit() else (1, 0, frame)